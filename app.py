@@ -1,29 +1,37 @@
 # app.py — MappingKML
-# NSW: layer 9, query ONLY by lotidstring (e.g. 13//DP1246224); separate BULK mode (parallel).
+# NSW: layer 9, query ONLY by lotidstring (e.g. 13//DP1246224); separate BULK mode.
 # QLD: NEW bulk mode by LOTPLAN string (e.g. 13SP181800). Per-line QLD still supported.
-# SA : planparcel OR title (volume/folio in any order) (unchanged)
-# Exports: GeoJSON / KML / KMZ — Google Earth balloons show ALL attributes.
+# SA : planparcel OR title (volume/folio in any order)
+# All states are batched: one WHERE ... IN (...) / OR'd request per BATCH_SIZE inputs.
+# Exports: GeoJSON / KML / KMZ — balloons show the fetched attributes (ALL with "Full attributes").
 
 import io
+import itertools
 import json
 import math
 import re
-import time
+import threading
 import zipfile
-from typing import Dict, List, Optional, Tuple
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
 
 import concurrent.futures
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pydeck as pdk
-import NSW_query
+from backend import nsw_query
 
-# Optional KML export
+# Optional fast JSON (parse + GeoJSON export); stdlib json otherwise
 try:
-    import simplekml
-    HAVE_SIMPLEKML = True
+    import orjson
+    HAVE_ORJSON = True
 except Exception:
-    HAVE_SIMPLEKML = False
+    HAVE_ORJSON = False
 
 # --------------------- App Config ---------------------
 
@@ -35,63 +43,120 @@ ENDPOINTS = {
     "SA":  "https://dpti.geohub.sa.gov.au/server/rest/services/Hosted/Reference_WFL1/FeatureServer/1/query",
 }
 
+# Columns used downstream (per-input matching, map tooltip, KML name); "*" only for full balloons
+OUT_FIELDS = {
+    "QLD": "OBJECTID,LOT,PLAN,LOT_AREA",  # LOTPLAN is added by the LOTPLAN pass only (not every layer has it)
+    "NSW": "lotidstring,planlabel,lotnumber,sectionnumber",
+    "SA":  "planparcel,volume,folio,parcel_id",
+}
+
 DEFAULT_VIEW = pdk.ViewState(latitude=-24.8, longitude=134.0, zoom=4.6, pitch=0, bearing=0)
+MAP_SIMPLIFY_TOL = 1e-5  # degrees (~1 m); map layer only, downloads keep full resolution
+# Attributes the map tooltip shows; the only properties shipped to the browser
+MAP_TOOLTIP_FIELDS = ("planlabel", "lotidstring", "lotnumber", "sectionnumber", "LOT", "PLAN", "volume", "folio")
 
 # Keep UI responsive
 REQUEST_TIMEOUT = 12
-REQUEST_RETRIES = 0
-MAX_WORKERS_NSW = 6   # parallel NSW bulk fetches
-MAX_WORKERS_QLD = 6   # parallel QLD bulk fetches
-
-SESSION = requests.Session()  # TCP reuse
+REQUEST_RETRIES = 0   # transport-level retries (Retry on the session adapter)
+REQUEST_BACKOFF = 0.4  # seconds, doubled per retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_MAXSIZE = 8      # keep-alive connections kept per host; not a concurrency limit
+MAX_WORKERS_PER_STATE = 3  # concurrent batch chunks per unit (each state search runs as its own unit)
+CACHE_TTL = 3600      # seconds an identical ArcGIS query is served from cache
+CACHE_MAX_ENTRIES = 2048  # bound the in-memory cache so long sessions don't grow unchecked
+BATCH_SIZE = 50       # predicates per batched ArcGIS request
+MAX_GET_WHERE = 1500  # longer WHERE clauses are POSTed (proxy URL limits)
+MAX_PAGES = 20        # hard stop when paging past a layer's maxRecordCount
+ETAG_MAX_ENTRIES = 64  # raw bodies kept for If-None-Match revalidation (the parsed results live in st.cache_data)
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    Process-wide HTTP session (TCP/TLS reuse). Cached as a resource so the pool
+    survives Streamlit's top-to-bottom reruns instead of being rebuilt per click.
+    One keep-alive pool per host, sized so concurrent chunk requests don't discard sockets.
+    Retries (connection errors, throttling and 5xx) are handled by urllib3 with exponential
+    backoff and Retry-After; once exhausted the last response is returned for raise_for_status.
+    """
+    retry = Retry(total=REQUEST_RETRIES, backoff_factor=REQUEST_BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset({"GET", "POST"}), respect_retry_after_header=True, raise_on_status=False)
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=len(ENDPOINTS), pool_maxsize=POOL_MAXSIZE, max_retries=retry))
+    return s
 
 # --------------------- Geometry Helpers ---------------------
 
-def _as_fc(fc_like):
-    if fc_like is None: return None
-    if isinstance(fc_like, str):
-        try: fc_like = json.loads(fc_like)
-        except Exception: return None
-    if not isinstance(fc_like, dict): return None
-    t = fc_like.get("type")
-    if t == "FeatureCollection":
-        feats = fc_like.get("features", [])
-        return {"type":"FeatureCollection","features":feats if isinstance(feats, list) else []}
-    if t == "Feature": return {"type":"FeatureCollection","features":[fc_like]}
-    if t in {"Point","MultiPoint","LineString","MultiLineString","Polygon","MultiPolygon"}:
-        return {"type":"FeatureCollection","features":[{"type":"Feature","geometry":fc_like,"properties":{}}]}
-    return None
+def _coords_point(c):
+    if isinstance(c,(list,tuple)) and len(c)>=2: yield c[:2]
 
-def _iter_coords(geom):
-    g = geom or {}; t = g.get("type"); c = g.get("coordinates")
-    if t == "Point":
-        if isinstance(c,(list,tuple)) and len(c)>=2: yield c[:2]
-    elif t in ("MultiPoint","LineString"):
-        for p in c or []:
-            if isinstance(p,(list,tuple)) and len(p)>=2: yield p[:2]
-    elif t in ("MultiLineString","Polygon"):
-        for part in c or []:
-            for p in part or []:
-                if isinstance(p,(list,tuple)) and len(p)>=2: yield p[:2]
-    elif t == "MultiPolygon":
-        for poly in c or []:
-            for ring in poly or []:
-                for p in ring or []:
-                    if isinstance(p,(list,tuple)) and len(p)>=2: yield p[:2]
+def _coords_depth1(c):
+    for p in c or []:
+        if isinstance(p,(list,tuple)) and len(p)>=2: yield p[:2]
 
-def _geom_bbox(geom):
-    minx=miny=math.inf; maxx=maxy=-math.inf; found=False
+def _coords_depth2(c):
+    for part in c or []:
+        yield from _coords_depth1(part)
+
+def _coords_depth3(c):
+    for poly in c or []:
+        for ring in poly or []:
+            yield from _coords_depth1(ring)
+
+def _coords_none(c):
+    return iter(())
+
+_GEOM_COORDS = {
+    "Point": _coords_point,
+    "MultiPoint": _coords_depth1, "LineString": _coords_depth1,
+    "MultiLineString": _coords_depth2, "Polygon": _coords_depth2,
+    "MultiPolygon": _coords_depth3,
+}
+
+def _iter_coords(geom):
+    g = geom or {}
+    return _GEOM_COORDS.get(g.get("type"), _coords_none)(g.get("coordinates"))
+
+# Nesting depth of the coordinate arrays per geometry type
+_GEOM_DEPTH = {"Point": 0, "MultiPoint": 1, "LineString": 1, "MultiLineString": 2, "Polygon": 2, "MultiPolygon": 3}
+
+def _flatten(coords, depth: int):
+    # Points of a coordinate array nested `depth` levels deep (1 = list of points)
+    return coords if depth <= 1 else itertools.chain.from_iterable(_flatten(c or [], depth - 1) for c in coords)
+
+def _coords_array(geom) -> Optional[np.ndarray]:
+    """(n, 2) float array of a geometry's x/y; raises on short or non-numeric coordinates."""
+    g = geom or {}
+    depth = _GEOM_DEPTH.get(g.get("type")); c = g.get("coordinates")
+    if depth is None or not c: return None
+    pts = [c] if depth == 0 else list(_flatten(c, depth))
+    if not pts: return None
+    # x/y only (drops any z); a point with fewer than two values leaves the count short and raises
+    flat = list(itertools.chain.from_iterable(p[:2] for p in pts))
+    if len(flat) != 2 * len(pts): raise ValueError("coordinate with fewer than two values")
+    xy = np.array(flat)
+    # Only real numbers (as _geom_bbox_py accepts): None or numeric strings give an object/str array
+    if xy.dtype.kind not in "biuf": raise TypeError("non-numeric coordinate")
+    return xy.astype(np.float64, copy=False).reshape(-1, 2)
+
+def _geom_bbox_py(geom):
+    # Collect valid x/y into C double buffers, then four C-level min/max passes
+    xs=array("d"); ys=array("d")
     for x,y in _iter_coords(geom):
-        if not (isinstance(x,(int,float)) and isinstance(y,(int,float))): continue
-        found=True
-        minx=min(minx,x); maxx=max(maxx,x)
-        miny=min(miny,y); maxy=max(maxy,y)
-    return (minx,miny,maxx,maxy) if found else None
+        if isinstance(x,(int,float)) and isinstance(y,(int,float)) and math.isfinite(x) and math.isfinite(y):
+            xs.append(x); ys.append(y)
+    return (min(xs),min(ys),max(xs),max(ys)) if xs else None
 
-def _merge_bbox(b1,b2):
-    if b1 is None: return b2
-    if b2 is None: return b1
-    return (min(b1[0],b2[0]), min(b1[1],b2[1]), max(b1[2],b2[2]), max(b1[3],b2[3]))
+def _geom_bbox(geom):
+    # Vectorized min/max over the ring arrays; malformed coordinates take the per-point walk
+    try:
+        xy = _coords_array(geom)
+    except (TypeError, ValueError, IndexError):
+        return _geom_bbox_py(geom)
+    if xy is None: return None
+    xy = xy[np.isfinite(xy).all(axis=1)]  # drop NaN/inf points in one vectorized pass
+    if not len(xy): return None
+    (minx, miny), (maxx, maxy) = xy.min(axis=0), xy.max(axis=0)
+    return (float(minx), float(miny), float(maxx), float(maxy))
 
 def _bbox_to_viewstate(bbox, pad=0.12):
     if not bbox: return DEFAULT_VIEW
@@ -100,46 +165,103 @@ def _bbox_to_viewstate(bbox, pad=0.12):
     minx-=dx; maxx+=dx; miny-=dy; maxy+=dy
     cx=(minx+maxx)/2; cy=(miny+maxy)/2
     extent=max(maxx-minx,maxy-miny)
-    if extent<=0 or not math.isfinite(extent): return pdk.ViewState(latitude=cy,longitude=cx,zoom=14)
-    if extent > 20: zoom = 5
-    elif extent > 10: zoom = 6
-    elif extent > 5: zoom = 7
-    elif extent > 2: zoom = 8
-    elif extent > 1: zoom = 9
-    elif extent > 0.5: zoom = 10
-    elif extent > 0.25: zoom = 11
-    elif extent > 0.1: zoom = 12
-    else: zoom = 13
+    if not math.isfinite(extent): return DEFAULT_VIEW
+    # Web Mercator: one 256px tile spans 360/2**z degrees. floor(...)+1, floored at 4, stays within ±1
+    # of the old 5..13 bucket ladder for extents down to ~0.022° (zoom 14); below that it deliberately
+    # keeps zooming in (to 17) for single small parcels where the ladder stopped at 13.
+    # A point (zero extent) is the limit of a tiny parcel, so it gets the same cap.
+    zoom = 17 if extent<=0 else max(4, min(17, math.floor(math.log2(360.0 / extent)) + 1))
     return pdk.ViewState(latitude=cy, longitude=cx, zoom=zoom)
 
-def _fit_view(fc_like):
-    fc=_as_fc(fc_like)
-    if not fc or not fc.get("features"):
+def _bbox_member(b) -> Optional[Tuple[float, float, float, float]]:
+    # GeoJSON "bbox" member as (minx, miny, maxx, maxy); 2D or 3D form, anything else is ignored
+    if isinstance(b, (list, tuple)) and len(b) in (4, 6):
+        return (b[0], b[1], b[2], b[3]) if len(b) == 4 else (b[0], b[1], b[3], b[4])
+    return None
+
+def _fit_view_fc(features: List[Dict]):
+    # Canonical feature list (as built by the fetchers); no re-wrapping or validation
+    if not features:
         return DEFAULT_VIEW
-    bbox=None
-    for f in fc["features"]:
-        bbox=_merge_bbox(bbox,_geom_bbox(f.get("geometry") or {}))
-    return _bbox_to_viewstate(bbox)
+    boxes=[b for b in (_bbox_member(f.get("bbox")) or _geom_bbox(f.get("geometry") or {}) for f in features) if b]
+    if not boxes:
+        return _bbox_to_viewstate(None)
+    arr=np.array(boxes)
+    mins=arr[:, :2].min(axis=0); maxs=arr[:, 2:].max(axis=0)
+    return _bbox_to_viewstate((float(mins[0]), float(mins[1]), float(maxs[0]), float(maxs[1])))
+
+def _simplify_line(points, tol: float, min_points: int):
+    """Douglas-Peucker on one ring/path; anything it can't reduce safely comes back as-is."""
+    try:
+        pts = np.asarray(points, dtype=np.float64)[:, :2]
+    except (TypeError, ValueError, IndexError):
+        return points
+    n = len(pts)
+    if n <= min_points or not np.isfinite(pts).all(): return points
+    keep = np.zeros(n, dtype=bool); keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1: continue
+        seg = pts[j] - pts[i]; rel = pts[i+1:j] - pts[i]
+        length = math.hypot(seg[0], seg[1])
+        if length == 0: d = np.hypot(rel[:, 0], rel[:, 1])  # closed ring: distance to the shared endpoint
+        else: d = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        k = int(d.argmax())
+        if d[k] > tol:
+            mid = i + 1 + k; keep[mid] = True
+            stack.append((i, mid)); stack.append((mid, j))
+    if keep.sum() < min_points: return points
+    return pts[keep].tolist()
+
+def _simplify_geom(geom: Dict, tol: float) -> Dict:
+    t = geom.get("type"); c = geom.get("coordinates") or []
+    if t == "Polygon":
+        c = [_simplify_line(r, tol, 4) for r in c]
+    elif t == "MultiPolygon":
+        c = [[_simplify_line(r, tol, 4) for r in poly or []] for poly in c]
+    elif t == "MultiLineString":
+        c = [_simplify_line(p, tol, 2) for p in c]
+    elif t == "LineString":
+        c = _simplify_line(c, tol, 2)
+    else:
+        return geom
+    return {"type": t, "coordinates": c}
+
+def _map_props(props: Dict) -> Dict:
+    return {k: props[k] for k in MAP_TOOLTIP_FIELDS if k in props}
+
+def _map_fc(features: List[Dict], tol: float = MAP_SIMPLIFY_TOL) -> Dict:
+    # Lighter copy for the browser: tooltip properties only, fewer vertices
+    return {"type":"FeatureCollection","features":[
+        {"type":"Feature","geometry":_simplify_geom(f.get("geometry") or {}, tol),"properties":_map_props(f.get("properties") or {})}
+        for f in features]}
 
 # --------------------- Parsing ---------------------
 
+# Cadastre identifiers are plain ASCII; re.ASCII keeps \d/\s off the Unicode tables.
 # NSW lotidstring OR one-slash; normalized to LOT//PLAN (uppercase)
-RE_NSW_LOTID = re.compile(r"^\s*(?P<lotid>\d+//[A-Za-z]{1,6}\d+)\s*$")
-RE_NSW_ONE_SLASH = re.compile(r"^\s*(?P<lot>\d+)\s*/\s*(?P<plan>[A-Za-z]{1,6}\d+)\s*$")
+RE_NSW_LOTID = re.compile(r"^\s*(?P<lotid>\d+//[A-Za-z]{1,6}\d+)\s*$", re.ASCII)
+RE_NSW_ONE_SLASH = re.compile(r"^\s*(?P<lot>\d+)\s*/\s*(?P<plan>[A-Za-z]{1,6}\d+)\s*$", re.ASCII)
 
 # QLD input formats (we'll normalize to a single LOTPLAN string like '13SP181800')
 RE_LOTPLAN_SLASH = re.compile(
-    r"^\s*(?P<lot>\d+)\s*(?:/(?P<section>\d+))?\s*/\s*(?P<plan_type>[A-Za-z]{1,6})\s*(?P<plan_number>\d+)\s*$"
+    r"^\s*(?P<lot>\d+)\s*(?:/(?P<section>\d+))?\s*/\s*(?P<plan_type>[A-Za-z]{1,6})\s*(?P<plan_number>\d+)\s*$", re.ASCII
 )
-RE_COMPACT = re.compile(r"^\s*(?P<lot>\d+)\s*(?P<plan_type>[A-Za-z]{1,6})\s*(?P<plan_number>\d+)\s*$")
+RE_COMPACT = re.compile(r"^\s*(?P<lot>\d+)\s*(?P<plan_type>[A-Za-z]{1,6})\s*(?P<plan_number>\d+)\s*$", re.ASCII)
 RE_VERBOSE = re.compile(
     r"^\s*Lot\s+(?P<lot>\d+)\s+on\s+(?P<plan_label>(Registered|Survey)\s+Plan)\s+(?P<plan_number>\d+)\s*$",
-    re.IGNORECASE
+    re.IGNORECASE | re.ASCII
 )
 
+# Normalized QLD LOTPLAN token, e.g. '13SP181800' (and the same with spaces between parts)
+RE_QLD_LOTPLAN = re.compile(r"^(?P<lot>\d+)(?P<plan_type>[A-Z]{1,6})(?P<plan_num>\d+)$", re.ASCII)
+RE_QLD_LOTPLAN_SPACED = re.compile(r"^\s*(\d+)\s*([A-Z]{1,6})\s*(\d+)\s*$", re.ASCII)
+RE_WS = re.compile(r"\s+")
+
 # SA
-RE_SA_PLANPARCEL = re.compile(r"^\s*(?P<planparcel>[A-Za-z]{1,2}\d+[A-Za-z]{1,2}\d+)\s*$")
-RE_SA_TITLEPAIR  = re.compile(r"^\s*(?P<a>\d{1,6})\s*/\s*(?P<b>\d{1,6})\s*$")
+RE_SA_PLANPARCEL = re.compile(r"^\s*(?P<planparcel>[A-Za-z]{1,2}\d+[A-Za-z]{1,2}\d+)\s*$", re.ASCII)
+RE_SA_TITLEPAIR  = re.compile(r"^\s*(?P<a>\d{1,6})\s*/\s*(?P<b>\d{1,6})\s*$", re.ASCII)
 
 def _qld_normalize_lotplan(raw: str) -> Optional[str]:
     """
@@ -152,7 +274,7 @@ def _qld_normalize_lotplan(raw: str) -> Optional[str]:
     if not raw:
         return None
     s = (str(raw) or "").strip().upper()
-    s = re.sub(r"\s+", " ", s)
+    s = RE_WS.sub(" ", s)
 
     # Pure compact: 13SP181800
     m = RE_COMPACT.match(s.replace(" ", ""))
@@ -177,166 +299,341 @@ def _qld_normalize_lotplan(raw: str) -> Optional[str]:
         return f"{m.group('lot')}{plan_type}{m.group('plan_number')}"
 
     # Already like '13SP181800' but with spaces e.g. '13 SP 181800'
-    m = re.match(r"^\s*(\d+)\s*([A-Z]{1,6})\s*(\d+)\s*$", s)
+    m = RE_QLD_LOTPLAN_SPACED.match(s)
     if m:
         return f"{m.group(1)}{m.group(2)}{m.group(3)}"
 
     return None
 
+def _parse_verbose_fast(raw: str) -> Optional[Dict]:
+    """
+    'Lot 3 on Survey Plan 181800' via str.split; None means let RE_VERBOSE decide.
+    """
+    parts = raw.split()
+    if len(parts) != 6:
+        return None
+    _, lot, on, label, plan, plan_number = parts
+    label = label.lower()
+    # isascii() too: isdigit() alone accepts fullwidth and other Unicode digits, which RE_VERBOSE (re.ASCII) rejects
+    if not (lot.isascii() and lot.isdigit() and plan_number.isascii() and plan_number.isdigit()
+            and on.lower() == "on" and plan.lower() == "plan"
+            and label in ("survey", "registered")):
+        return None
+    return {"raw":raw,"lot":lot,"section":None,
+            "plan_type":"SP" if label == "survey" else "RP","plan_number":plan_number}
+
+def _qld_item(raw: str, lot: str, section: Optional[str], plan_type: str, plan_number: str) -> Dict:
+    return {"raw":raw,"lot":lot,"section":section,"plan_type":plan_type,"plan_number":plan_number}
+
+# Line formats in precedence order -> item builder (m is the combined match, k the kind's group prefix)
+_LINE_KINDS = (
+    ("nsw_lotid", RE_NSW_LOTID, lambda raw, m, k: {"raw":raw,"nsw_lotid":raw}),
+    ("nsw_one_slash", RE_NSW_ONE_SLASH, lambda raw, m, k: {"raw":raw,"nsw_lotid":raw}),
+    ("lotplan_slash", RE_LOTPLAN_SLASH,
+     lambda raw, m, k: _qld_item(raw, m[k+"lot"], m[k+"section"], (m[k+"plan_type"] or "").upper(), m[k+"plan_number"])),
+    ("compact", RE_COMPACT,
+     lambda raw, m, k: _qld_item(raw, m[k+"lot"], None, (m[k+"plan_type"] or "").upper(), m[k+"plan_number"])),
+    ("verbose", RE_VERBOSE,
+     lambda raw, m, k: _qld_item(raw, m[k+"lot"], None, "SP" if "SURVEY" in (m[k+"plan_label"] or "").upper() else "RP",
+                                 m[k+"plan_number"])),
+    ("sa_planparcel", RE_SA_PLANPARCEL, lambda raw, m, k: {"raw":raw,"sa_planparcel":m[k+"planparcel"].upper()}),
+    ("sa_titlepair", RE_SA_TITLEPAIR, lambda raw, m, k: {"raw":raw,"sa_titlepair":(m[k+"a"],m[k+"b"])}),
+)
+_LINE_BUILD = {kind: build for kind, _, build in _LINE_KINDS}
+
+def _combine_line_patterns() -> re.Pattern:
+    """
+    One alternation over all line formats, tried in _LINE_KINDS order, so a line
+    is classified in a single regex pass; m.lastgroup names the kind that matched.
+    Inner groups are prefixed with the kind ('compact__lot') as names must be unique.
+    """
+    alts=[]
+    for kind, rx, _ in _LINE_KINDS:
+        body = re.sub(r"\(\?P<(\w+)>", rf"(?P<{kind}__\1>", rx.pattern.removeprefix("^").removesuffix("$"))
+        if rx.flags & re.IGNORECASE: body = f"(?i:{body})"
+        alts.append(f"(?P<{kind}>{body})")
+    return re.compile("|".join(alts), re.ASCII)
+
+RE_LINE = _combine_line_patterns()
+
+@st.cache_data(show_spinner=False)
 def parse_queries(multiline: str) -> List[Dict]:
     items=[]
     for raw in [x.strip() for x in (multiline or "").splitlines() if x.strip()]:
-        # NSW first
-        m = RE_NSW_LOTID.match(raw) or RE_NSW_ONE_SLASH.match(raw)
-        if m:
-            items.append({"raw": raw, "nsw_lotid": raw})
-            continue
-        # QLD various forms captured for legacy per-line mode
-        m = RE_LOTPLAN_SLASH.match(raw)
+        # Verbose QLD form has a fixed prefix; split it before trying any regex
+        if raw[:4].lower() == "lot ":
+            item = _parse_verbose_fast(raw)
+            if item:
+                items.append(item)
+                continue
+        m = RE_LINE.fullmatch(raw)
         if m:
-            items.append({"raw":raw,"lot":m.group("lot"),"section":m.group("section"),
-                          "plan_type":(m.group("plan_type") or "").upper(),"plan_number":m.group("plan_number")})
+            items.append(_LINE_BUILD[m.lastgroup](raw, m, m.lastgroup + "__"))
             continue
+        # Compact QLD with stray spaces inside the numbers ('13 SP 181 800')
         m = RE_COMPACT.match(raw.replace(" ", ""))
         if m:
-            items.append({"raw":raw,"lot":m.group("lot"),"section":None,
-                          "plan_type":(m.group("plan_type") or "").upper(),"plan_number":m.group("plan_number")})
-            continue
-        m = RE_VERBOSE.match(raw)
-        if m:
-            plan_type = "SP" if "Survey" in (m.group("plan_label") or "") else "RP"
-            items.append({"raw":raw,"lot":m.group("lot"),"section":None,
-                          "plan_type":plan_type,"plan_number":m.group("plan_number")})
+            items.append(_qld_item(raw, m.group("lot"), None, (m.group("plan_type") or "").upper(), m.group("plan_number")))
             continue
-        m = RE_SA_PLANPARCEL.match(raw)
-        if m:
-            items.append({"raw":raw,"sa_planparcel":m.group("planparcel").upper()}); continue
-        m = RE_SA_TITLEPAIR.match(raw)
-        if m:
-            a,b=m.group("a"),m.group("b"); items.append({"raw":raw,"sa_titlepair":(a,b)}); continue
         items.append({"raw":raw,"unparsed":True})
     return items
 
 # --------------------- HTTP / ArcGIS ---------------------
 
-def _http_get_json(url: str, params: Dict, retries: int = REQUEST_RETRIES, timeout: int = REQUEST_TIMEOUT) -> Dict:
-    last=None
-    for attempt in range(retries+1):
-        try:
-            base=dict(f="json", outSR=4326, returnGeometry="true", geometryPrecision=6, returnExceededLimitFeatures="false")
-            r = SESSION.get(url, params={**base, **params}, timeout=timeout)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last=e
-            if attempt<retries: time.sleep(0.4)
-    raise last if last else RuntimeError("Unknown request error")
+class ArcGISError(Exception):
+    """Query rejected by the service: HTTP 200 with an {"error": {...}} body."""
+
+@st.cache_resource
+def _etag_store() -> Tuple[Dict[Tuple, Tuple[str, bytes]], threading.Lock]:
+    # (url, params) -> (ETag, raw body); outlives reruns and st.cache_data expiry so a
+    # repeat GET can be revalidated with If-None-Match and answered by an empty 304.
+    # Worker threads share it, so reads and evictions go through the lock.
+    return {}, threading.Lock()
+
+def _http_json(url: str, params: Dict, timeout: int = REQUEST_TIMEOUT) -> Dict:
+    base=dict(f="json", outSR=4326, returnGeometry="true", geometryPrecision=6, returnExceededLimitFeatures="false")
+    payload={**base, **params}
+    # Batched WHERE clauses can outgrow GET URL limits; ArcGIS accepts the same params form-encoded.
+    use_post=len(str(payload.get("where") or "")) > MAX_GET_WHERE
+    if use_post:
+        r = get_session().post(url, data=payload, timeout=timeout)
+    else:
+        etags, lock = _etag_store(); key=(url, tuple(sorted((k, str(v)) for k, v in payload.items())))
+        with lock:
+            cached = etags.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        r = get_session().get(url, params=payload, headers=headers, timeout=timeout)
+        if r.status_code == 304 and cached:
+            body = cached[1]
+            return orjson.loads(body) if HAVE_ORJSON else json.loads(body)
+    r.raise_for_status()
+    data = orjson.loads(r.content) if HAVE_ORJSON else r.json()
+    # Raising (not returning the body) keeps a rejected query out of st.cache_data and the ETag store
+    err = data.get("error") if isinstance(data, dict) else None
+    if err:
+        msg = err.get("message") if isinstance(err, dict) else err
+        details = "; ".join(map(str, err.get("details") or ())) if isinstance(err, dict) else ""
+        raise ArcGISError(f"{msg} ({details})" if details else str(msg))
+    etag = r.headers.get("ETag")
+    if etag and not use_post:
+        with lock:
+            etags.pop(key, None)
+            while len(etags) >= ETAG_MAX_ENTRIES: etags.pop(next(iter(etags)))
+            etags[key] = (etag, r.content)
+    return data
+
+def _arcgis_geometry(geom: Optional[Dict]) -> Optional[Dict]:
+    if not geom: return None
+    if "rings" in geom: return {"type":"Polygon","coordinates":geom["rings"]}
+    if "paths" in geom: return {"type":"MultiLineString","coordinates":geom["paths"]}
+    if "x" in geom and "y" in geom: return {"type":"Point","coordinates":[geom["x"],geom["y"]]}
+    return None
+
+def _feature(geo: Dict, attrs: Dict) -> Dict:
+    # RFC 7946 Feature bbox, computed once here (and cached with the query) instead of on every map fit
+    f={"type":"Feature","geometry":geo,"properties":attrs}
+    bbox=_geom_bbox(geo)
+    if bbox: f["bbox"]=list(bbox)
+    return f
+
+def _rings_to_geojson(geom: Optional[Dict]) -> Optional[Dict]:
+    rings = (geom or {}).get("rings")
+    return {"type":"Polygon","coordinates":rings} if rings is not None else None
+
+# Layer-level geometryType picks the converter once per response; other layers use the generic sniffing
+_ESRI_GEOMETRY = {"esriGeometryPolygon": _rings_to_geojson}
 
 def _arcgis_to_fc(data: Dict) -> Dict:
-    feats=[]
-    for g in data.get("features", []):
-        geom=g.get("geometry"); attrs=g.get("attributes", {})
-        if not geom: continue
-        if "rings" in geom:
-            geo={"type":"Polygon","coordinates":geom["rings"]}
-        elif "paths" in geom:
-            geo={"type":"MultiLineString","coordinates":geom["paths"]}
-        elif "x" in geom and "y" in geom:
-            geo={"type":"Point","coordinates":[geom["x"],geom["y"]]}
-        else:
-            continue
-        feats.append({"type":"Feature","geometry":geo,"properties":attrs})
+    to_geo = _ESRI_GEOMETRY.get(data.get("geometryType"), _arcgis_geometry)
+    feats=[_feature(geo, g.get("attributes", {}))
+           for g in data.get("features", ()) if (geo := to_geo(g.get("geometry")))]
     return {"type":"FeatureCollection","features":feats}
 
+def _feature_id(f: Dict):
+    # OBJECTID when the layer returned it, else the attributes + bbox (enough to spot a repeated page)
+    props = f.get("properties") or {}
+    oid = props.get("OBJECTID", props.get("objectid"))
+    return oid if oid is not None else (json.dumps(props, sort_keys=True, default=str), tuple(f.get("bbox") or ()))
+
+# Identical (url, where, out_fields) queries are served from Streamlit's cache across reruns.
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
 def _arcgis_query(url: str, where: str, out_fields: str = "*") -> Dict:
-    data = _http_get_json(url, {"where": where, "outFields": out_fields})
-    return _arcgis_to_fc(data)
+    params={"where": where, "outFields": out_fields}
+    data = _http_json(url, params)
+    fc = _arcgis_to_fc(data)
+    if not (data.get("exceededTransferLimit") and fc["features"]):
+        return fc
+    # More than one response holds: re-read in OBJECTID order (resultOffset is only stable with
+    # orderByFields), keeping features not seen yet. Layers without supportsPagination ignore
+    # resultOffset and repeat the same page; a later page with no new ids ends the loop.
+    seen = {_feature_id(f) for f in fc["features"]}
+    paging = {**params, "orderByFields": "OBJECTID", "resultRecordCount": len(fc["features"])}
+    offset = 0
+    for _ in range(MAX_PAGES):
+        data = _http_json(url, {**paging, "resultOffset": offset})
+        page = _arcgis_to_fc(data)["features"]
+        new = [f for f in page if _feature_id(f) not in seen]
+        seen.update(map(_feature_id, new)); fc["features"].extend(new)
+        if not page or not data.get("exceededTransferLimit") or (offset and not new):
+            break
+        offset += len(page)
+    return fc
+
+def _q(value: str) -> str:
+    # SQL string literal for a WHERE clause; values are normalized client-side so
+    # predicates stay plain field='VALUE' comparisons the layer can index.
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _chunked(items: List, size: int = BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def _executor(max_workers: int) -> concurrent.futures.ThreadPoolExecutor:
+    # Workers inherit the script run context so cached calls inside them behave as on the script thread
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())
+    )
+
+def _query_features(url: str, wheres: List[str], out_fields: str) -> Iterator[Dict]:
+    """
+    Run several WHERE clauses against one layer and yield all returned features.
+    Chunks run concurrently on the pooled session (up to MAX_WORKERS_PER_STATE).
+    """
+    if len(wheres) <= 1:
+        fcs = [_arcgis_query(url, w, out_fields) for w in wheres]
+    else:
+        with _executor(min(MAX_WORKERS_PER_STATE, len(wheres))) as ex:
+            fcs = list(ex.map(lambda w: _arcgis_query(url, w, out_fields), wheres))
+    for fc in fcs:
+        yield from fc.get("features", [])
+
+def _attr(props: Dict, *keys) -> str:
+    for k in keys:
+        v = props.get(k)
+        if v not in (None, ""):
+            return str(v).strip().upper()
+    return ""
 
 # --------------------- Fetchers ---------------------
 
-# QLD (legacy per-line)
-def fetch_qld(lot: str, plan_type: str, plan_number: str) -> Dict:
+# QLD (per-line)
+def fetch_qld_batch(pairs: List[Tuple[str, str]], out_fields: str = OUT_FIELDS["QLD"]) -> Dict[Tuple[str, str], List[Dict]]:
+    """
+    Batched QLD fetch for (lot, plan_full) pairs, e.g. ('13', 'SP181800').
+    One OR'd WHERE per BATCH_SIZE pairs; features are keyed back by LOT/PLAN.
+    """
     url = ENDPOINTS["QLD"]
-    plan_full = f"{plan_type}{plan_number}".upper()
-    where = f"(PLAN='{plan_full}') AND (LOT='{lot}')"
-    return _arcgis_query(url, where)
+    keys = list(dict.fromkeys((str(lot).strip().upper(), str(plan).strip().upper()) for lot, plan in pairs))
+    out: Dict[Tuple[str, str], List[Dict]] = {k: [] for k in keys}
+    wheres = [" OR ".join(f"((PLAN={_q(plan)}) AND (LOT={_q(lot)}))" for lot, plan in chunk) for chunk in _chunked(keys)]
+    for f in _query_features(url, wheres, out_fields):
+        props = f.get("properties") or {}
+        out.setdefault((_attr(props, "LOT", "lot"), _attr(props, "PLAN", "plan")), []).append(f)
+    return out
+
+# NSW (layer 9 accepts plain comparisons only, so no UPPER(); ids are normalized upper-case)
+def fetch_nsw_batch(lotids: List[str], out_fields: str = OUT_FIELDS["NSW"]) -> Dict[str, List[Dict]]:
+    """
+    Batched NSW fetch: one `lotidstring IN (...)` request per BATCH_SIZE lotidstrings.
+    Returns {normalized lotidstring: [features]} so callers can report per-input misses.
+    """
+    url = ENDPOINTS["NSW"]
+    keys = list(dict.fromkeys(nsw_query.normalize_lotid(x) for x in lotids if x and str(x).strip()))
+    out: Dict[str, List[Dict]] = {k: [] for k in keys}
+    wheres = ["lotidstring IN (" + ",".join(map(_q, chunk)) + ")" for chunk in _chunked(keys)]
+    for f in _query_features(url, wheres, out_fields):
+        out.setdefault(_attr(f.get("properties") or {}, "lotidstring"), []).append(f)
+    return out
 
 # SA
-def fetch_sa_by_planparcel(planparcel_str: str) -> Dict:
-    url = ENDPOINTS["SA"]
-    where = f"planparcel='{planparcel_str.upper()}'"
-    return _arcgis_query(url, where)
+def _sa_title_where(a: str, b: str) -> str:
+    # Title inputs may be volume/folio or folio/volume; one OR'd predicate covers both orders.
+    if a == b:
+        return f"(volume={_q(a)}) AND (folio={_q(b)})"
+    return f"((volume={_q(a)}) AND (folio={_q(b)})) OR ((volume={_q(b)}) AND (folio={_q(a)}))"
 
-def fetch_sa_by_title(volume: str, folio: str) -> Dict:
+def fetch_sa_planparcel_batch(planparcels: List[str], out_fields: str = OUT_FIELDS["SA"]) -> Dict[str, List[Dict]]:
     url = ENDPOINTS["SA"]
-    where = f"(volume='{volume}') AND (folio='{folio}')"
-    return _arcgis_query(url, where)
-
-# ------------- NEW: QLD bulk by LOTPLAN (lot+plan as one token) -------------
-
-def qld_fetch_one_lotplan(lotplan: str) -> Dict:
+    keys = list(dict.fromkeys(x.strip().upper() for x in planparcels if x and x.strip()))
+    out: Dict[str, List[Dict]] = {k: [] for k in keys}
+    wheres = ["planparcel IN (" + ",".join(map(_q, chunk)) + ")" for chunk in _chunked(keys)]
+    for f in _query_features(url, wheres, out_fields):
+        out.setdefault(_attr(f.get("properties") or {}, "planparcel"), []).append(f)
+    return out
+
+def fetch_sa_title_batch(pairs: List[Tuple[str, str]], out_fields: str = OUT_FIELDS["SA"]) -> Dict[Tuple[str, str], List[Dict]]:
     """
-    One-shot QLD by LOTPLAN token, e.g. '13SP181800'.
-    Strategy:
-        1) Prefer WHERE LOTPLAN='13SP181800' (if the service supports LOTPLAN field)
-        2) Fallback: split to LOT='13' AND PLAN='SP181800'
+    Batched SA title fetch: OR of per-pair predicates (both orders), keyed back
+    to the input pair by the returned volume/folio.
     """
-    url = ENDPOINTS["QLD"]
-    lp = (lotplan or "").strip().upper()
-    if not lp:
-        return {"type":"FeatureCollection","features":[]}
+    url = ENDPOINTS["SA"]
+    keys = list(dict.fromkeys((str(a).strip(), str(b).strip()) for a, b in pairs))
+    out: Dict[Tuple[str, str], List[Dict]] = {k: [] for k in keys}
+    # (volume, folio) as returned -> input pairs it satisfies, in either order
+    index: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+    for a, b in keys:
+        index.setdefault((a, b), []).append((a, b))
+        if a != b:
+            index.setdefault((b, a), []).append((a, b))
+    wheres = [" OR ".join(f"({_sa_title_where(a, b)})" for a, b in chunk) for chunk in _chunked(keys)]
+    for f in _query_features(url, wheres, out_fields):
+        props = f.get("properties") or {}
+        for key in index.get((_attr(props, "volume"), _attr(props, "folio")), ()):
+            out[key].append(f)
+    return out
 
-    # Try LOTPLAN directly
-    try:
-        fc = _arcgis_query(url, f"LOTPLAN='{lp}'")
-        if fc.get("features"):
-            return fc
-    except Exception:
-        # service might reject unknown field, fall back
-        pass
-
-    # Fallback: split LOT + PLAN
-    m = re.match(r"^(?P<lot>\d+)(?P<plan_type>[A-Z]{1,6})(?P<plan_num>\d+)$", lp)
-    if not m:
-        return {"type":"FeatureCollection","features":[]}
-    lot = m.group("lot")
-    plan_full = f"{m.group('plan_type')}{m.group('plan_num')}"
-    where = f"(PLAN='{plan_full}') AND (LOT='{lot}')"
-    return _arcgis_query(url, where)
+# ------------- NEW: QLD bulk by LOTPLAN (lot+plan as one token) -------------
 
-def qld_fetch_bulk_lotplan(tokens: List[str], max_workers: int = MAX_WORKERS_QLD) -> Dict:
+def qld_fetch_bulk_lotplan(tokens: List[str], out_fields: str = OUT_FIELDS["QLD"]) -> Dict:
     """
-    Parallel QLD fetch by LOTPLAN tokens and merge features.
+    Batched QLD fetch by LOTPLAN tokens and merge features.
     Accepts inputs in many forms and normalizes to '13SP181800'.
+    One request per BATCH_SIZE tokens for each pass:
+        1) LOTPLAN IN (...)
+        2) OR'd LOT/PLAN pairs for tokens the first pass missed
+    Both passes are issued at once (one round trip instead of two); LOTPLAN
+    matches win and the LOT/PLAN results only fill the gaps.
     """
-    norm: List[str] = []
-    for t in tokens:
-        lp = _qld_normalize_lotplan(t)
-        if lp:
-            norm.append(lp)
-
+    norm = list(dict.fromkeys(lp for lp in (_qld_normalize_lotplan(t) for t in tokens) if lp))
     if not norm:
         return {"type":"FeatureCollection","features":[]}
 
+    url = ENDPOINTS["QLD"]
     features: List[Dict] = []
     errors: List[str] = []
+    found = set()
 
-    def _task(lp: str):
-        try:
-            return lp, qld_fetch_one_lotplan(lp)
-        except Exception as e:
-            return lp, {"error": str(e)}
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
-        for lp, res in ex.map(_task, norm):
-            if "error" in res:
-                errors.append(f"{lp}: {res['error']}")
-            else:
-                features.extend(res.get("features", []))
+    pairs: Dict[str, Tuple[str, str]] = {}
+    for lp in norm:
+        m = RE_QLD_LOTPLAN.match(lp)
+        if m:
+            pairs[lp] = (m.group("lot"), f"{m.group('plan_type')}{m.group('plan_num')}")
 
-    if errors:
-        st.warning("QLD bulk had issues:\n- " + "\n- ".join(errors[:10]), icon="⚠️")
-        if len(errors) > 10: st.caption(f"... plus {len(errors) - 10} more.")
+    def _by_lotplan() -> List[Dict]:
+        wheres = ["LOTPLAN IN (" + ",".join(map(_q, chunk)) + ")" for chunk in _chunked(norm)]
+        fields = out_fields if out_fields == "*" else f"{out_fields},LOTPLAN"
+        try:
+            return list(_query_features(url, wheres, fields))
+        except Exception:
+            # service might reject unknown field; LOT/PLAN results cover every token
+            return []
+
+    with _executor(2) as ex:
+        fut_lotplan = ex.submit(_by_lotplan)
+        fut_pairs = ex.submit(fetch_qld_batch, list(pairs.values()), out_fields) if pairs else None
+
+        for f in fut_lotplan.result():
+            features.append(f)
+            found.add(_attr(f.get("properties") or {}, "LOTPLAN", "lotplan"))
+        if fut_pairs is not None:
+            try:
+                by_pair = fut_pairs.result()
+            except Exception as e:
+                errors.append(f"LOT/PLAN fallback for {len(pairs)} token(s): {e}")
+                by_pair = {}
+            for lp, key in pairs.items():
+                if lp not in found:
+                    features.extend(by_pair.get(key, []))
 
     # de-dup: objectid + LOT + PLAN
     seen=set(); uniq=[]
@@ -348,57 +645,107 @@ def qld_fetch_bulk_lotplan(tokens: List[str], max_workers: int = MAX_WORKERS_QLD
         if sig not in seen:
             seen.add(sig); uniq.append(f)
 
-    return {"type":"FeatureCollection","features":uniq}
+    fc = {"type":"FeatureCollection","features":uniq}
+    if errors:
+        # Non-fatal; reported by the caller (this may run off the script thread)
+        fc["_errors"] = errors
+    return fc
 
 # --------------------- Exports ---------------------
 
 def features_to_geojson(fc: Dict) -> bytes:
+    if HAVE_ORJSON:
+        return orjson.dumps(fc, option=orjson.OPT_NON_STR_KEYS)
     return json.dumps(fc, ensure_ascii=False).encode("utf-8")
 
-def features_to_kml_kmz(fc: Dict, as_kmz: bool = False) -> Tuple[str, bytes]:
-    if not HAVE_SIMPLEKML:
-        raise RuntimeError("simplekml is not installed; cannot create KML/KMZ.")
-    kml = simplekml.Kml()
+KML_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+KML_TAIL = "</Document></kml>\n"
+
+def _kml_coords(points) -> str:
+    return " ".join(f"{p[0]},{p[1]},0" for p in points or [])
+
+# Placemark name: first non-empty of these, in order
+KML_NAME_KEYS = ("lotidstring", "LOTPLAN", "lotplan", "planparcel", "planlabel", "PLAN_LABEL", "PLAN", "plan")
+
+def _kml_key_order(props: Dict) -> List[str]:
+    return sorted(props, key=lambda k: (k.casefold(), k))
+
+def _kml_description(props: Dict, keys: Optional[List[str]] = None) -> str:
+    # Balloon text, "key: value" per non-empty attribute
+    if not props: return "No attributes"
+    if keys is None: keys = _kml_key_order(props)
+    return "\n".join([f"{k}: {props[k]}" for k in keys if props[k] not in (None,"")]) or "No attributes"
+
+def _kml_placemarks(feat: Dict, keys: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Yield the <Placemark> XML for one feature (one per path for MultiLineString).
+    `keys` is the balloon attribute order; _iter_kml sorts it once per attribute set.
+    """
+    props = feat.get("properties") or {}
+    name = next((props[k] for k in KML_NAME_KEYS if props.get(k)), "parcel")
+    desc = _kml_description(props, keys)
+    head=f"<Placemark><name>{escape(str(name))}</name><description>{escape(desc)}</description>"
+
+    geom = feat.get("geometry") or {}
+    t = geom.get("type")
+    if t == "Polygon":
+        rings=geom.get("coordinates") or []
+        if rings:
+            inner="".join(
+                f"<innerBoundaryIs><LinearRing><coordinates>{_kml_coords(r)}</coordinates></LinearRing></innerBoundaryIs>"
+                for r in rings[1:]
+            )
+            yield (f"{head}<Polygon><outerBoundaryIs><LinearRing><coordinates>{_kml_coords(rings[0])}"
+                   f"</coordinates></LinearRing></outerBoundaryIs>{inner}</Polygon></Placemark>\n")
+    elif t == "MultiLineString":
+        for path in geom.get("coordinates") or []:
+            yield f"{head}<LineString><coordinates>{_kml_coords(path)}</coordinates></LineString></Placemark>\n"
+    elif t == "LineString":
+        yield f"{head}<LineString><coordinates>{_kml_coords(geom.get('coordinates'))}</coordinates></LineString></Placemark>\n"
+    elif t == "Point":
+        c=(geom.get("coordinates") or [None,None])[:2]
+        if len(c) == 2 and None not in c:
+            yield f"{head}<Point><coordinates>{_kml_coords([c])}</coordinates></Point></Placemark>\n"
+
+def _iter_kml(fc: Dict) -> Iterator[str]:
+    yield KML_HEAD
+    # Features from one layer share an attribute set, so the sort runs once per layer, not per feature
+    orders: Dict[Tuple[str, ...], List[str]] = {}
     for feat in fc.get("features", []):
-        props = (feat.get("properties") or {}).copy()
-        name = (
-            props.get("lotidstring")
-            or props.get("LOTPLAN") or props.get("lotplan")
-            or props.get("planparcel")
-            or props.get("planlabel") or props.get("PLAN_LABEL")
-            or props.get("PLAN") or props.get("plan")
-            or "parcel"
-        )
-        lines=[f"{k}: {v}" for k,v in sorted(props.items(), key=lambda kv: kv[0].lower()) if v not in (None,"")]
-        desc="\n".join(lines) if lines else "No attributes"
-
-        geom = feat.get("geometry") or {}
-        t = geom.get("type")
-        if t == "Polygon":
-            coords=[[(lng,lat) for lng,lat in ring] for ring in geom.get("coordinates",[])]
-            poly=kml.newpolygon(name=name, description=desc)
-            if coords:
-                poly.outerboundaryis=coords[0]
-                if len(coords)>1: poly.innerboundaryis=coords[1:]
-        elif t == "MultiLineString":
-            for path in geom.get("coordinates",[]):
-                ls=kml.newlinestring(name=name, description=desc)
-                ls.coords=[(lng,lat) for lng,lat in path]
-        elif t == "LineString":
-            ls=kml.newlinestring(name=name, description=desc)
-            ls.coords=[(lng,lat) for lng,lat in geom.get("coordinates",[])]
-        elif t == "Point":
-            pt=kml.newpoint(name=name, description=desc)
-            lng,lat=(geom.get("coordinates") or [None,None])[:2]
-            if lng is not None and lat is not None: pt.coords=[(lng,lat)]
-
-    if as_kmz:
-        buf=io.BytesIO()
-        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr("doc.kml", kml.kml())
-        return ("application/vnd.google-earth.kmz", buf.getvalue())
-    else:
-        return ("application/vnd.google-earth.kml+xml", kml.kml().encode("utf-8"))
+        sig = tuple(feat.get("properties") or ())
+        keys = orders.get(sig)
+        if keys is None:
+            keys = orders[sig] = _kml_key_order(feat.get("properties") or {})
+        yield from _kml_placemarks(feat, keys)
+    yield KML_TAIL
+
+def kml_to_kmz(kml_data: bytes, stored: bool = False) -> bytes:
+    # Zip already-rendered KML. Both downloads are offered together and the KML button needs the
+    # whole document in memory anyway, so zipping those bytes beats streaming _iter_kml into the
+    # entry, which would render every placemark a second time to save no memory.
+    # stored=True skips DEFLATE entirely: larger file, no compression pass.
+    buf=io.BytesIO()
+    compression = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(buf, "w", compression=compression, compresslevel=1) as zf:
+        zf.writestr("doc.kml", kml_data)
+    return buf.getvalue()
+
+def features_to_kml(fc: Dict) -> Tuple[str, bytes]:
+    # The one placemark render per result set; the KMZ is kml_to_kmz over these bytes
+    return ("application/vnd.google-earth.kml+xml", "".join(_iter_kml(fc)).encode("utf-8"))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def kml_downloads(geojson: bytes, fast_kmz: bool = False) -> Tuple[str, bytes, bytes]:
+    """(mime, kml, kmz) keyed on the GeoJSON export, so re-showing the same results skips the rebuild."""
+    fc = orjson.loads(geojson) if HAVE_ORJSON else json.loads(geojson)
+    mime, kml_data = features_to_kml(fc)
+    return mime, kml_data, kml_to_kmz(kml_data, stored=fast_kmz)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def map_layer_data(geojson: bytes) -> Dict:
+    """_map_fc of the GeoJSON export; a repeat search of the same parcels skips re-simplifying."""
+    fc = orjson.loads(geojson) if HAVE_ORJSON else json.loads(geojson)
+    return _map_fc(fc.get("features") or [])
 
 # --------------------- UI ---------------------
 
@@ -418,6 +765,14 @@ with st.sidebar:
         "- **SA:** `D10001AL12`  •  `FOLIO/VOLUME` or `VOLUME/FOLIO` (e.g., `1234/5678`)"
     )
 
+    st.markdown("---")
+    full_attrs = st.checkbox("Full attributes (KML balloons)", value=False,
+                             help="Request every layer column instead of the few used for matching and tooltips.")
+    fast_kmz = st.checkbox("Fast KMZ export (no compression)", value=False,
+                           help="Store doc.kml uncompressed: quicker to build for large selections, bigger download.")
+    force_refresh = st.checkbox("Force refresh", value=False,
+                                help="Ignore cached ArcGIS results for this search and query the services again.")
+
     st.markdown("---")
     # NSW bulk toggle
     nsw_bulk_mode = st.checkbox("NSW bulk mode (lotidstring list)", value=False)
@@ -469,105 +824,113 @@ accum_features: List[Dict] = []
 state_counts = {"NSW":0, "QLD":0, "SA":0}
 state_warnings: List[str] = []
 
+def _fields(state: str) -> str:
+    return "*" if full_attrs else OUT_FIELDS[state]
+
 def _add_features(fc):
-    for f in (fc or {}).get("features", []):
-        accum_features.append(f)
+    feats = (fc or {}).get("features")
+    if feats:
+        accum_features.extend(feats)
+
+def _collect(state: str, by_key: Dict, keys, miss_msg) -> None:
+    # Report per-input hits/misses from a batched fetch result, in input order
+    for k in dict.fromkeys(keys):
+        feats = by_key.get(k, [])
+        state_counts[state] += len(feats)
+        if not feats: state_warnings.append(miss_msg(k))
+        accum_features.extend(feats)
+
+def _report_bulk(key: str, res) -> None:
+    # NSW bulk returns {lotid: [features]}; QLD bulk a FeatureCollection with optional "_errors"
+    if isinstance(res, Exception):
+        st.warning(f"{key} had issues: {res}", icon="⚠️")
+        return
+    if key == "NSW bulk":
+        fc_bulk = {"type":"FeatureCollection","features":[f for feats in res.values() for f in feats]}
+    else:
+        fc_bulk = res
+    errors = fc_bulk.get("_errors") or []
+    if errors:
+        st.warning(f"{key} had issues:\n- " + "\n- ".join(errors[:10]), icon="⚠️")
+        if len(errors) > 10: st.caption(f"... plus {len(errors) - 10} more.")
+    c = len(fc_bulk.get("features", [])); state_counts[key.split()[0]] += c
+    if c == 0: st.warning(f"{key}: no parcels found.", icon="⚠️")
+    else: st.success(f"{key}: found {c} feature(s).")
+    _add_features(fc_bulk)
+
+def _error_text(state: str, e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return f"{state} request timed out."
+    return f"{state} error: {e}"
+
+def _bulk_tokens(text: str) -> List[str]:
+    return [x.strip() for part in text.splitlines() for x in part.split(",") if x.strip()]
 
 # --------------------- Run ---------------------
 
 if run_btn and (sel_qld or sel_nsw or sel_sa):
+    if force_refresh:
+        # Only the ArcGIS result cache; parsing and export caches stay valid
+        _arcgis_query.clear()
     with st.spinner("Querying selected states..."):
-
-        # --- NSW (bulk or per-line) ---
+        nsw_items = [p for p in parsed if "nsw_lotid" in p]
+        # parse_queries already upper-cases plan_type (lot/plan_number are ASCII digits), so these are batch keys as-is
+        qld_pairs = [(p["lot"], f"{p['plan_type']}{p['plan_number']}") for p in parsed if p.get("plan_type")]
+        planparcels = [p["sa_planparcel"] for p in parsed if "sa_planparcel" in p]
+        titlepairs = [p["sa_titlepair"] for p in parsed if "sa_titlepair" in p]
+
+        # One batched fetch per unit; units run concurrently and are reported below,
+        # in this order, from the script thread (Streamlit calls are not thread-safe).
+        units: Dict[str, Tuple] = {}
         if sel_nsw:
             if nsw_bulk_mode and nsw_bulk_text.strip():
-                raw_items = [x.strip() for part in nsw_bulk_text.splitlines() for x in part.split(",")]
-                lotids = [x for x in raw_items if x]
+                lotids = _bulk_tokens(nsw_bulk_text)
                 st.caption(f"NSW bulk: {len(lotids)} lotidstring(s)")
-                fc_bulk = NSW_query.nsw_fetch_bulk(lotids)
-                c = len(fc_bulk.get("features", [])); state_counts["NSW"] += c
-                if c == 0: st.warning("NSW bulk: no parcels found.", icon="⚠️")
-                else: st.success(f"NSW bulk: found {c} feature(s).")
-                _add_features(fc_bulk)
-            else:
-                for p in parsed:
-                    if p.get("unparsed"): continue
-                    if "nsw_lotid" in p:
-                        lotid = p["nsw_lotid"]
-                        st.caption(f"NSW where: lotidstring='{NSW_query._nsw_normalize_lotid(lotid)}'")
-                        try:
-                            fc = NSW_query.nsw_fetch_one(lotid)
-                        except requests.exceptions.Timeout:
-                            state_warnings.append("NSW request timed out.")
-                            fc = {"type":"FeatureCollection","features":[]}
-                        except Exception as e:
-                            state_warnings.append(f"NSW error for {p.get('raw')}: {e}")
-                            fc = {"type":"FeatureCollection","features":[]}
-                        c = len(fc.get("features", [])); state_counts["NSW"] += c
-                        if c == 0: state_warnings.append(f"NSW: No parcels for lotidstring '{lotid}'.")
-                        _add_features(fc)
-
-        # --- QLD (bulk or per-line) ---
+                units["NSW bulk"] = (fetch_nsw_batch, lotids, _fields("NSW"))
+            elif nsw_items:
+                st.caption(f"NSW where: lotidstring IN ({len(nsw_items)} value(s))")
+                units["NSW"] = (fetch_nsw_batch, [p["nsw_lotid"] for p in nsw_items], _fields("NSW"))
         if sel_qld:
             if qld_bulk_mode and qld_bulk_text.strip():
-                raw_items = [x.strip() for part in qld_bulk_text.splitlines() for x in part.split(",")]
-                lotplans = [x for x in raw_items if x]
+                lotplans = _bulk_tokens(qld_bulk_text)
                 st.caption(f"QLD bulk: {len(lotplans)} LOTPLAN token(s)")
-                fc_bulk = qld_fetch_bulk_lotplan(lotplans)
-                c = len(fc_bulk.get("features", [])); state_counts["QLD"] += c
-                if c == 0: st.warning("QLD bulk: no parcels found.", icon="⚠️")
-                else: st.success(f"QLD bulk: found {c} feature(s).")
-                _add_features(fc_bulk)
-            else:
-                for p in parsed:
-                    if p.get("unparsed") or p.get("nsw_lotid") or p.get("sa_planparcel") or p.get("sa_titlepair"):
-                        continue
-                    pt = (p.get("plan_type") or "").upper()
-                    if pt:
-                        try:
-                            fc = fetch_qld(p.get("lot"), pt, p.get("plan_number"))
-                        except requests.exceptions.Timeout:
-                            state_warnings.append("QLD request timed out.")
-                            fc = {"type":"FeatureCollection","features":[]}
-                        except Exception as e:
-                            state_warnings.append(f"QLD error for {p.get('raw')}: {e}")
-                            fc = {"type":"FeatureCollection","features":[]}
-                        c = len(fc.get("features", [])); state_counts["QLD"] += c
-                        if c == 0:
-                            state_warnings.append(f"QLD: No parcels for lot '{p.get('lot')}', plan '{pt}{p.get('plan_number')}'.")
-                        _add_features(fc)
-
-        # --- SA (unchanged) ---
+                units["QLD bulk"] = (qld_fetch_bulk_lotplan, lotplans, _fields("QLD"))
+            elif qld_pairs:
+                units["QLD"] = (fetch_qld_batch, qld_pairs, _fields("QLD"))
         if sel_sa:
-            for p in parsed:
-                if p.get("unparsed"): continue
-                try:
-                    if "sa_planparcel" in p:
-                        fc = fetch_sa_by_planparcel(p["sa_planparcel"])
-                        c = len(fc.get("features", [])); state_counts["SA"] += c
-                        if c == 0: state_warnings.append(f"SA: No parcels for planparcel '{p['sa_planparcel']}'.")
-                        _add_features(fc); 
-                        continue
-
-                    if "sa_titlepair" in p:
-                        a,b = p["sa_titlepair"]
-                        fc1 = fetch_sa_by_title(volume=a, folio=b)
-                        fc2 = fetch_sa_by_title(volume=b, folio=a)
-                        seen=set(); merged={"type":"FeatureCollection","features":[]}
-                        for fc_try in (fc1, fc2):
-                            for feat in fc_try.get("features", []):
-                                pid = (feat.get("properties") or {}).get("parcel_id") or json.dumps(feat.get("geometry", {}), sort_keys=True)
-                                if pid in seen: 
-                                    continue
-                                seen.add(pid); merged["features"].append(feat)
-                        c = len(merged["features"]); state_counts["SA"] += c
-                        if c == 0:
-                            state_warnings.append(f"SA: No parcels for title inputs '{a}/{b}'. (Tried both volume/folio and folio/volume.)")
-                        _add_features(merged)
-                except requests.exceptions.Timeout:
-                    state_warnings.append("SA request timed out.")
-                except Exception as e:
-                    state_warnings.append(f"SA error for {p.get('raw')}: {e}")
+            if planparcels:
+                units["SA planparcel"] = (fetch_sa_planparcel_batch, planparcels, _fields("SA"))
+            if titlepairs:
+                units["SA title"] = (fetch_sa_title_batch, titlepairs, _fields("SA"))
+
+        results: Dict[str, object] = {}
+        if units:
+            with _executor(len(units)) as ex:
+                futures = {ex.submit(fn, *args): key for key, (fn, *args) in units.items()}
+                for fut in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[fut]] = fut.result()
+                    except Exception as e:
+                        results[futures[fut]] = e
+
+        for key in units:
+            res = results[key]
+            state = key.split()[0]
+            if key.endswith(" bulk"):
+                _report_bulk(key, res)
+            elif isinstance(res, Exception):
+                state_warnings.append(_error_text(state, res))
+            elif key == "NSW":
+                _collect("NSW", res, (nsw_query.normalize_lotid(p["nsw_lotid"]) for p in nsw_items),
+                         lambda k: f"NSW: No parcels for lotidstring '{k}'.")
+            elif key == "QLD":
+                _collect("QLD", res, qld_pairs,
+                         lambda k: f"QLD: No parcels for lot '{k[0]}', plan '{k[1]}'.")
+            elif key == "SA planparcel":
+                _collect("SA", res, planparcels, lambda k: f"SA: No parcels for planparcel '{k}'.")
+            else:
+                _collect("SA", res, titlepairs,
+                         lambda k: f"SA: No parcels for title inputs '{k[0]}/{k[1]}'. (Tried both volume/folio and folio/volume.)")
 
 # --------------------- Map ---------------------
 
@@ -580,12 +943,15 @@ if state_warnings:
 if run_btn and (sel_qld or sel_nsw or sel_sa):
     st.success(f"Found — NSW: {state_counts['NSW']}  |  QLD: {state_counts['QLD']}  |  SA: {state_counts['SA']}")
 
+# Serialize once per run; the map layer and KML/KMZ are derived from (and cached on) the GeoJSON bytes
+geojson_data = features_to_geojson(fc_all) if accum_features else b""
+
 layers=[]
 if accum_features:
     layers.append(
         pdk.Layer(
             "GeoJsonLayer",
-            fc_all,
+            map_layer_data(geojson_data),
             pickable=True,
             stroked=True,
             filled=True,
@@ -604,7 +970,7 @@ tooltip_html = """
 </div>
 """
 
-view_state=_fit_view(fc_all if accum_features else None)
+view_state=_fit_view_fc(accum_features)
 deck=pdk.Deck(layers=layers, initial_view_state=view_state, map_style=None, tooltip={"html":tooltip_html})
 st.pydeck_chart(deck, use_container_width=True)
 
@@ -613,24 +979,22 @@ st.pydeck_chart(deck, use_container_width=True)
 st.subheader("Downloads")
 d1,d2,d3=st.columns(3)
 
+kml_mime, kml_data, kmz_data = kml_downloads(geojson_data, fast_kmz) if accum_features else (None, b"", b"")
+
 with d1:
     if accum_features:
-        st.download_button("⬇️ GeoJSON", data=features_to_geojson(fc_all), file_name="parcels.geojson", mime="application/geo+json")
+        st.download_button("⬇️ GeoJSON", data=geojson_data, file_name="parcels.geojson", mime="application/geo+json")
     else:
         st.caption("No features yet.")
 
 with d2:
-    if HAVE_SIMPLEKML and accum_features:
-        mime, kml_data = features_to_kml_kmz(fc_all, as_kmz=False)
-        st.download_button("⬇️ KML", data=kml_data, file_name="parcels.kml", mime=mime)
-    elif not HAVE_SIMPLEKML:
-        st.caption("Install `simplekml` for KML/KMZ: pip install simplekml")
+    if accum_features:
+        st.download_button("⬇️ KML", data=kml_data, file_name="parcels.kml", mime=kml_mime)
     else:
         st.caption("No features yet.")
 
 with d3:
-    if HAVE_SIMPLEKML and accum_features:
-        mime, kmz_data = features_to_kml_kmz(fc_all, as_kmz=True)
+    if accum_features:
         st.download_button("⬇️ KMZ", data=kmz_data, file_name="parcels.kmz", mime="application/vnd.google-earth.kmz")
     else:
         st.caption(" ")
@@ -26,11 +26,22 @@ QLD_FEATURESERVER_LOT_BOUNDARY = (
 # Common QLD plan prefixes you’re likely to see
 _PREFIXES = ["SP", "RP", "CP", "BUP", "GTP", "PUP", "SL", "AP", "CH", "MCH", "PH", "SUB", "USL"]
 
+# Input formats tried in order by _parse_qld_lotplan
+_RE_QLD_VERBOSE = re.compile(
+    r"(?i)lot\s*(\d+)\s*(?:on\s*(?:registered|survey)\s*plan\s*)?"
+    r"([A-Za-z]{1,4})?\s*(\d{1,7})"
+)
+_RE_QLD_SEPARATED = re.compile(r"^\s*(\d+)\s*[/ ]{0,2}\s*([A-Za-z]{1,4})\s*(\d{1,7})\s*$")
+_RE_QLD_SPACED = re.compile(r"^\s*(\d+)\s*([A-Za-z]{1,4})\s*(\d{1,7})\s*$")
+_RE_QLD_NO_PREFIX = re.compile(r"^\s*(\d+)\s+(\d{1,7})\s*$")
+_RE_QLD_COMPACT = re.compile(r"^(\d+)([A-Za-z]{1,4})(\d{1,7})$")
+_RE_WS = re.compile(r"\s+")
+
 class QLDQueryError(Exception):
     pass
 
 def _clean(s: str) -> str:
-    return re.sub(r"\s+", "", s.strip())
+    return _RE_WS.sub("", s.strip())
 
 def _parse_qld_lotplan(raw: str) -> Tuple[str, str, str]:
     """
@@ -40,11 +51,7 @@ def _parse_qld_lotplan(raw: str) -> Tuple[str, str, str]:
     s = raw.strip()
 
     # 1) Verbose "Lot X on Survey/Registered Plan Y"
-    m = re.search(
-        r"(?i)lot\s*(\d+)\s*(?:on\s*(?:registered|survey)\s*plan\s*)?"
-        r"([A-Za-z]{1,4})?\s*(\d{1,7})",
-        s,
-    )
+    m = _RE_QLD_VERBOSE.search(s)
     if m:
         lot = m.group(1)
         pref = (m.group(2) or "SP").upper()  # default to SP when omitted in verbose text
@@ -53,21 +60,21 @@ def _parse_qld_lotplan(raw: str) -> Tuple[str, str, str]:
         return lot, planlabel, f"{lot}{planlabel}"
 
     # 2) Slash/space combos like "3//SP181800", "3/SP181800", "3 SP181800"
-    m = re.match(r"^\s*(\d+)\s*[/ ]{0,2}\s*([A-Za-z]{1,4})\s*(\d{1,7})\s*$", s)
+    m = _RE_QLD_SEPARATED.match(s)
     if m:
         lot = m.group(1)
         planlabel = f"{m.group(2).upper()}{m.group(3)}"
         return lot, planlabel, f"{lot}{planlabel}"
 
     # 3) Pure concatenated lotplan like "3SP181800"
-    m = re.match(r"^\s*(\d+)\s*([A-Za-z]{1,4})\s*(\d{1,7})\s*$", s)
+    m = _RE_QLD_SPACED.match(s)
     if m:
         lot = m.group(1)
         planlabel = f"{m.group(2).upper()}{m.group(3)}"
         return lot, planlabel, f"{lot}{planlabel}"
 
     # 4) Two tokens: "3 181800" -> assume SP if prefix omitted
-    m = re.match(r"^\s*(\d+)\s+(\d{1,7})\s*$", s)
+    m = _RE_QLD_NO_PREFIX.match(s)
     if m:
         lot = m.group(1)
         planlabel = f"SP{m.group(2)}"
@@ -75,7 +82,7 @@ def _parse_qld_lotplan(raw: str) -> Tuple[str, str, str]:
 
     # 5) Already a single combined token like "3SP181800" (no spaces at all)
     t = _clean(s)
-    m = re.match(r"^(\d+)([A-Za-z]{1,4})(\d{1,7})$", t)
+    m = _RE_QLD_COMPACT.match(t)
     if m:
         lot = m.group(1)
         planlabel = f"{m.group(2).upper()}{m.group(3)}"
@@ -101,6 +108,7 @@ def query_qld(user_input: str, timeout: int = 30) -> Dict[str, Any]:
         "outFields": "*",
         "returnGeometry": "true",
         "outSR": 4326,   # WGS84 for your map/KML
+        "geometryPrecision": 6,
         "f": "geojson",
     }
 
@@ -56,6 +56,7 @@ def query_sa_feature_server(where: str, out_sr: int = 4326):
         "outFields": "*",
         "returnGeometry": "true",
         "outSR": str(out_sr),
+        "geometryPrecision": "6",
         "cacheHint": "true",
         "resultRecordCount": "2000",
     }
@@ -28,6 +28,7 @@ def _query(where: str, out_sr: int = 4326) -> dict:
         "outFields": "*",
         "returnGeometry": "true",
         "outSR": str(out_sr),
+        "geometryPrecision": "6",
         "cacheHint": "true",
         "resultRecordCount": "2000",
     }
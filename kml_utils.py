@@ -7,9 +7,7 @@ for usage examples.
 """
 
 import io
-import os
 import zipfile
-import tempfile
 from datetime import datetime
 from typing import Dict, Any, Iterable
 
@@ -253,60 +251,58 @@ def generate_shapefile(features: list, region: str) -> bytes:
             "Shapefile generation requires the 'shapefile' library (pyshp)."
             " Please install it or omit shapefile exports."
         ) from e
-    with tempfile.TemporaryDirectory() as temp_dir:
-        base_path = os.path.join(temp_dir, "parcels")
-        w = shapefile.Writer(base_path)
-        # Define attribute fields.  Names must be <=10 chars for DBF.
-        w.field("LOT", "C", size=10)
-        w.field("SEC", "C", size=10)
-        w.field("PLAN", "C", size=15)
-        w.autoBalance = 1
-        for feat in features:
-            props = feat.get("properties", {})
-            if region == "QLD":
-                lot_val = props.get("lot", "") or ""
-                sec_val = ""
-                plan_val = props.get("plan", "") or ""
-            else:
-                lot_val = props.get("lotnumber", "") or ""
-                sec_val = props.get("sectionnumber", "") or ""
-                plan_val = props.get("planlabel", "") or ""
-            w.record(lot_val, sec_val, plan_val)
-            geom = feat.get("geometry", {})
-            gtype = geom.get("type")
-            coords = geom.get("coordinates")
-            parts = []
-            if gtype == "Polygon":
-                for ring in coords:
+    # Write the components straight into memory; no temp directory round trip.
+    shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    w = shapefile.Writer(shp=shp, shx=shx, dbf=dbf)
+    # Define attribute fields.  Names must be <=10 chars for DBF.
+    w.field("LOT", "C", size=10)
+    w.field("SEC", "C", size=10)
+    w.field("PLAN", "C", size=15)
+    w.autoBalance = 1
+    for feat in features:
+        props = feat.get("properties", {})
+        if region == "QLD":
+            lot_val = props.get("lot", "") or ""
+            sec_val = ""
+            plan_val = props.get("plan", "") or ""
+        else:
+            lot_val = props.get("lotnumber", "") or ""
+            sec_val = props.get("sectionnumber", "") or ""
+            plan_val = props.get("planlabel", "") or ""
+        w.record(lot_val, sec_val, plan_val)
+        geom = feat.get("geometry", {})
+        gtype = geom.get("type")
+        coords = geom.get("coordinates")
+        parts = []
+        if gtype == "Polygon":
+            for ring in coords:
+                if ring and ring[0] != ring[-1]:
+                    ring = ring + [ring[0]]
+                parts.append(ring)
+        elif gtype == "MultiPolygon":
+            for poly in coords:
+                for ring in poly:
                     if ring and ring[0] != ring[-1]:
                         ring = ring + [ring[0]]
                     parts.append(ring)
-            elif gtype == "MultiPolygon":
-                for poly in coords:
-                    for ring in poly:
-                        if ring and ring[0] != ring[-1]:
-                            ring = ring + [ring[0]]
-                        parts.append(ring)
-            if parts:
-                w.poly(parts)
-        w.close()
-        # Write the projection file (.prj)
-        prj_text = (
-            'GEOGCS["WGS 84",DATUM["WGS_1984",'
-            'SPHEROID["WGS 84",6378137,298.257223563],'
-            'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0],'
-            'UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]'
-        )
-        with open(base_path + ".prj", "w") as prj:
-            prj.write(prj_text)
-        # Zip up the component files
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w") as z:
-            for ext in (".shp", ".shx", ".dbf", ".prj"):
-                file_path = base_path + ext
-                if os.path.exists(file_path):
-                    z.write(file_path, arcname="parcels" + ext)
-        return zip_buffer.getvalue()
+        if parts:
+            w.poly(parts)
+    w.close()
+    # Write the projection file (.prj)
+    prj_text = (
+        'GEOGCS["WGS 84",DATUM["WGS_1984",'
+        'SPHEROID["WGS 84",6378137,298.257223563],'
+        'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0],'
+        'UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]'
+    )
+    # Zip up the component files
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as z:
+        z.writestr("parcels.shp", shp.getvalue())
+        z.writestr("parcels.shx", shx.getvalue())
+        z.writestr("parcels.dbf", dbf.getvalue())
+        z.writestr("parcels.prj", prj_text)
+    return zip_buffer.getvalue()
 
 
 def get_bounds(features: list):
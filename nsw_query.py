@@ -105,6 +105,7 @@ def query_nsw_lsp(user_input: str, timeout: int = 30) -> Dict[str, Any]:
         "where": where,
         "outFields": "*",
         "outSR": 4326,
+        "geometryPrecision": 6,
         "f": "geojson",
         "returnGeometry": "true",
     }
@@ -1,12 +1,147 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import re
+import threading
+import time
+
+try:
+    import orjson
+    HAVE_ORJSON = True
+except Exception:
+    HAVE_ORJSON = False
 
 app = Flask(__name__)
 CORS(app)
 
+NSW_QUERY = 'https://maps.six.nsw.gov.au/arcgis/rest/services/public/NSW_Cadastre/MapServer/9/query'
+QLD_QUERY = 'https://spatial-gis.information.qld.gov.au/arcgis/rest/services/PlanningCadastre/LandParcelPropertyFramework/MapServer/4/query'
 SA_FEATURESERVER = "https://dpti.geohub.sa.gov.au/server/rest/services/Hosted/Reference_WFL1/FeatureServer/1/query"
+MAX_WORKERS = 8
+QLD_LOTPLAN_RE = re.compile(r'^(\d+)([A-Z].+)$')
+BATCH_SIZE = 100  # ids per batched WHERE clause
+CACHE_TTL = 86400  # seconds a found id is served from _CACHE
+CACHE_MISS_TTL = 300  # seconds an id with no features is; short so one empty response can't hide a parcel
+CACHE_MAX_ENTRIES = 20000
+
+# One keep-alive pool shared by every worker thread (Session is safe for concurrent requests).
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# (region, key) -> (fetched_at, [feature, ...]); empty lists cache misses (for CACHE_MISS_TTL).
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _q(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _parse_query(user_input):
+    """Split one query into its (nsw, qld, sa) lookup keys; None where it doesn't apply."""
+    nsw = qld = sa = None
+    lot_str = sec_str = plan_str = ""
+    if '/' in user_input:
+        parts = user_input.split('/')
+        if len(parts) == 3:
+            lot_str, sec_str, plan_str = parts[0].strip(), parts[1].strip(), parts[2].strip()
+        elif len(parts) == 2:
+            lot_str, sec_str, plan_str = parts[0].strip(), '', parts[1].strip()
+        else:
+            lot_str = sec_str = plan_str = ''
+    if sec_str == '' and '//' in user_input:
+        lot_str, plan_str = user_input.split('//')
+        sec_str = ''
+    plan_num = ''.join(filter(str.isdigit, plan_str))
+    if lot_str and plan_num:
+        nsw = (lot_str.upper(), sec_str.upper(), int(plan_num))
+    m = QLD_LOTPLAN_RE.match(user_input.replace(' ', '').upper())
+    if m:
+        qld = m.group(1) + m.group(2)
+        # South Australia search using parcel identifier
+        sa = user_input.strip().upper()
+    return nsw, qld, sa
+
+
+def _nsw_where(key):
+    lot_str, sec_str, plan_num = key
+    sec = f"sectionnumber={_q(sec_str)}" if sec_str else "(sectionnumber IS NULL OR sectionnumber = '')"
+    return f"(lotnumber={_q(lot_str)} AND {sec} AND plannumber={plan_num})"
+
+
+def _nsw_key(props):
+    try:
+        plan_num = int(props.get('plannumber'))
+    except (TypeError, ValueError):
+        return None
+    return (str(props.get('lotnumber') or '').upper(), str(props.get('sectionnumber') or '').upper(), plan_num)
+
+
+# region -> (query url, batched WHERE builder, outFields, feature -> query key)
+SERVICES = {
+    'NSW': (NSW_QUERY, lambda keys: ' OR '.join(map(_nsw_where, keys)),
+            'lotnumber,sectionnumber,plannumber,planlabel', _nsw_key),
+    'QLD': (QLD_QUERY, lambda keys: f"lotplan IN ({','.join(map(_q, keys))})",
+            'lot,plan,lotplan,locality', lambda p: str(p.get('lotplan') or '').upper()),
+    'SA': (SA_FEATURESERVER, lambda keys: f"UPPER(PARCEL_ID) IN ({','.join(map(_q, keys))})",
+           # Hosted layer: fields come back lowercase (parcel_id), whatever case the WHERE used
+           '*', lambda p: str(p.get('parcel_id') or p.get('PARCEL_ID') or '').upper()),
+}
+
+
+def _fetch_batch(region, keys):
+    """One POSTed request for a batch of keys; returns {key: [feature, ...]}, or None on failure."""
+    url, build_where, out_fields, key_of = SERVICES[region]
+    params = {
+        'where': build_where(keys),
+        'outFields': out_fields,
+        'outSR': '4326',
+        'geometryPrecision': '6',
+        'returnGeometry': 'true',
+        'f': 'geoJSON'
+    }
+    try:
+        # POST: a batched WHERE can outgrow GET URL limits.
+        res = SESSION.post(url, data=params, timeout=10)
+        data = orjson.loads(res.content) if HAVE_ORJSON else res.json()
+    except Exception:
+        return None
+    if not isinstance(data, dict) or 'error' in data:
+        return None
+    grouped = {}
+    for feat in data.get('features', []) or []:
+        grouped.setdefault(key_of(feat.get('properties') or {}), []).append(feat)
+    return grouped
+
+
+def _cache_get(region, keys):
+    """Split keys into ({key: features} still fresh in _CACHE, [keys to fetch])."""
+    now = time.monotonic()
+    hits, missing = {}, []
+    with _CACHE_LOCK:
+        for key in keys:
+            entry = _CACHE.get((region, key))
+            if entry and now - entry[0] < (CACHE_TTL if entry[1] else CACHE_MISS_TTL):
+                hits[key] = entry[1]
+            else:
+                missing.append(key)
+    return hits, missing
+
+
+def _cache_set(region, keys, grouped):
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        # Only keys not cached yet need room; re-cached ones replace their own entry.
+        overflow = len(_CACHE) + sum((region, key) not in _CACHE for key in keys) - CACHE_MAX_ENTRIES
+        if overflow > 0:
+            # Oldest first (insertion order), until there is room for this batch.
+            for stale in list(_CACHE)[:overflow]:
+                del _CACHE[stale]
+        for key in keys:
+            _CACHE.pop((region, key), None)
+            _CACHE[(region, key)] = (now, grouped.get(key, []))
 
 
 @app.route('/search', methods=['POST'])
@@ -15,84 +150,34 @@ def search():
     queries = data.get('queries', [])
     if isinstance(queries, str):
         queries = [queries]
+    parsed = [_parse_query(q) for q in queries]
+    regions_order = list(SERVICES)
+    # Group ids by service: K queries -> ceil(K / BATCH_SIZE) requests per state,
+    # and the batches overlap on the pool.
+    # Ids already looked up within CACHE_TTL skip the network entirely.
+    jobs = []
+    found = {}
+    for i, region in enumerate(regions_order):
+        keys = list(dict.fromkeys(p[i] for p in parsed if p[i] is not None))
+        found[region], keys = _cache_get(region, keys)
+        jobs += [(region, keys[j:j + BATCH_SIZE]) for j in range(0, len(keys), BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for (region, keys), grouped in zip(jobs, pool.map(lambda job: _fetch_batch(*job), jobs)):
+            if grouped is None:
+                continue
+            found[region].update(grouped)
+            _cache_set(region, keys, grouped)
     features = []
     regions = []
-    for user_input in queries:
-        lot_str = sec_str = plan_str = ""
-        if '/' in user_input:
-            parts = user_input.split('/')
-            if len(parts) == 3:
-                lot_str, sec_str, plan_str = parts[0].strip(), parts[1].strip(), parts[2].strip()
-            elif len(parts) == 2:
-                lot_str, sec_str, plan_str = parts[0].strip(), '', parts[1].strip()
-            else:
-                lot_str = sec_str = plan_str = ''
-        if sec_str == '' and '//' in user_input:
-            lot_str, plan_str = user_input.split('//')
-            sec_str = ''
-        plan_num = ''.join(filter(str.isdigit, plan_str))
-        if lot_str and plan_num:
-            where = [f"lotnumber='{lot_str}'"]
-            if sec_str:
-                where.append(f"sectionnumber='{sec_str}'")
-            else:
-                where.append("(sectionnumber IS NULL OR sectionnumber = '')")
-            where.append(f"plannumber={plan_num}")
-            url = 'https://maps.six.nsw.gov.au/arcgis/rest/services/public/NSW_Cadastre/MapServer/9/query'
-            params = {
-                'where': ' AND '.join(where),
-                'outFields': 'lotnumber,sectionnumber,planlabel',
-                'outSR': '4326',
-                'f': 'geoJSON'
-            }
-            try:
-                res = requests.get(url, params=params, timeout=10)
-                data = res.json()
-            except Exception:
-                data = {}
-            for feat in data.get('features', []) or []:
+    for p in parsed:
+        for i, region in enumerate(regions_order):
+            for feat in found[region].get(p[i], []) if p[i] is not None else []:
                 features.append(feat)
-                regions.append('NSW')
-        inp = user_input.replace(' ', '').upper()
-        m = re.match(r'^(\d+)([A-Z].+)$', inp)
-        if not m:
-            continue
-        lot_str = m.group(1)
-        plan_str = m.group(2)
-        url = 'https://spatial-gis.information.qld.gov.au/arcgis/rest/services/PlanningCadastre/LandParcelPropertyFramework/MapServer/4/query'
-        params = {
-            'where': f"lot='{lot_str}' AND plan='{plan_str}'",
-            'outFields': 'lot,plan,lotplan,locality',
-            'outSR': '4326',
-            'f': 'geoJSON'
-        }
-        try:
-            res = requests.get(url, params=params, timeout=10)
-            data = res.json()
-        except Exception:
-            data = {}
-        for feat in data.get('features', []) or []:
-            features.append(feat)
-            regions.append('QLD')
-
-        # South Australia search using parcel identifier
-        parcel_id = user_input.strip().upper()
-        sa_params = {
-            'where': f"UPPER(PARCEL_ID)='{parcel_id}'",
-            'outFields': '*',
-            'outSR': '4326',
-            'returnGeometry': 'true',
-            'f': 'geoJSON'
-        }
-        try:
-            res = requests.get(SA_FEATURESERVER, params=sa_params, timeout=10)
-            data = res.json()
-        except Exception:
-            data = {}
-        for feat in data.get('features', []) or []:
-            features.append(feat)
-            regions.append('SA')
-    return jsonify({'features': features, 'regions': regions})
+                regions.append(region)
+    body = {'features': features, 'regions': regions}
+    if HAVE_ORJSON:
+        return app.response_class(orjson.dumps(body), mimetype='application/json')
+    return jsonify(body)
 
 
 if __name__ == '__main__':
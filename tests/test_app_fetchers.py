@@ -0,0 +1,161 @@
+import json
+import re
+
+import pytest
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.status_code = 200
+        self.headers = {}
+        self.content = json.dumps(payload).encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    """Answer ArcGIS queries from a handler(url, params) and record each request's params."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def get(self, url, params=None, **kwargs):
+        self.calls.append(params)
+        return FakeResponse(self.handler(url, params))
+
+    def post(self, url, data=None, **kwargs):
+        self.calls.append(data)
+        return FakeResponse(self.handler(url, data))
+
+
+def esri(attributes, x=150.0, y=-28.0):
+    ring = [[x, y], [x + 0.1, y], [x + 0.1, y - 0.1], [x, y]]
+    return {"attributes": attributes, "geometry": {"rings": [ring]}}
+
+
+@pytest.fixture
+def arcgis(monkeypatch):
+    def install(handler):
+        session = FakeSession(handler)
+        monkeypatch.setattr(app, "get_session", lambda: session)
+        return session
+    return install
+
+
+def quoted(where):
+    return re.findall(r"'([^']*)'", where)
+
+
+def test_fetch_qld_batch_keys_features_by_lot_plan(arcgis):
+    def handler(url, p):
+        pairs = re.findall(r"PLAN='([^']*)'\) AND \(LOT='([^']*)'", p["where"])
+        return {"features": [esri({"LOT": lot, "PLAN": plan}) for plan, lot in pairs if lot == "13"]}
+
+    session = arcgis(handler)
+    out = app.fetch_qld_batch([("13", "sp181800"), (" 2 ", "RP1"), ("13", "SP181800")])
+    assert list(out) == [("13", "SP181800"), ("2", "RP1")]
+    assert [f["properties"] for f in out[("13", "SP181800")]] == [{"LOT": "13", "PLAN": "SP181800"}]
+    assert out[("2", "RP1")] == []
+    assert len(session.calls) == 1
+
+
+def test_fetch_qld_batch_chunks_by_batch_size(arcgis):
+    session = arcgis(lambda url, p: {"features": []})
+    app.fetch_qld_batch([(str(i), "SP1") for i in range(2 * app.BATCH_SIZE + 1)])
+    assert len(session.calls) == 3
+
+
+def test_fetch_nsw_batch_normalizes_and_keys_by_lotidstring(arcgis):
+    def handler(url, p):
+        assert p["where"] == "lotidstring IN ('13//DP1246224','7//DP1')"
+        return {"features": [esri({"lotidstring": "13//dp1246224"})]}
+
+    arcgis(handler)
+    out = app.fetch_nsw_batch(["13//dp1246224", " 13//DP1246224 ", "7/DP1", ""])
+    assert list(out) == ["13//DP1246224", "7//DP1"]
+    assert len(out["13//DP1246224"]) == 1 and out["7//DP1"] == []
+
+
+def test_fetch_sa_title_batch_matches_either_order(arcgis):
+    def handler(url, p):
+        return {"features": [esri({"volume": "1234", "folio": "5678"}), esri({"volume": "9", "folio": "9"})]}
+
+    session = arcgis(handler)
+    out = app.fetch_sa_title_batch([("5678", "1234"), ("9", "9"), ("1", "2")])
+    assert len(out[("5678", "1234")]) == 1
+    assert len(out[("9", "9")]) == 1
+    assert out[("1", "2")] == []
+    where = session.calls[0]["where"]
+    assert "((volume='5678') AND (folio='1234')) OR ((volume='1234') AND (folio='5678'))" in where
+    assert "((volume='9') AND (folio='9'))" in where  # a == b needs only one order
+
+
+def test_qld_bulk_prefers_lotplan_and_dedups(arcgis):
+    def handler(url, p):
+        if "LOTPLAN" in p["where"]:
+            hit = esri({"OBJECTID": 1, "LOT": "13", "PLAN": "SP181800", "LOTPLAN": "13SP181800"})
+            return {"features": [hit, hit]}
+        return {"features": [esri({"OBJECTID": 1, "LOT": "13", "PLAN": "SP181800"}),
+                             esri({"OBJECTID": 2, "LOT": "2", "PLAN": "RP5"})]}
+
+    session = arcgis(handler)
+    fc = app.qld_fetch_bulk_lotplan(["13SP181800", "Lot 2 on Registered Plan 5", "13 SP 181800"])
+    assert [f["properties"].get("LOTPLAN") for f in fc["features"]] == ["13SP181800", None]
+    assert [f["properties"]["OBJECTID"] for f in fc["features"]] == [1, 2]
+    assert "_errors" not in fc
+    fields = {p["where"].startswith("LOTPLAN"): p["outFields"] for p in session.calls}
+    assert fields == {True: app.OUT_FIELDS["QLD"] + ",LOTPLAN", False: app.OUT_FIELDS["QLD"]}
+
+
+def test_qld_bulk_falls_back_when_lotplan_is_rejected(arcgis):
+    def handler(url, p):
+        if "LOTPLAN" in p["where"]:
+            return {"error": {"code": 400, "message": "Invalid field: LOTPLAN"}}
+        return {"features": [esri({"OBJECTID": 2, "LOT": "2", "PLAN": "RP5"})]}
+
+    arcgis(handler)
+    fc = app.qld_fetch_bulk_lotplan(["2RP5"])
+    assert [f["properties"]["PLAN"] for f in fc["features"]] == ["RP5"]
+
+
+def test_error_body_raises(arcgis):
+    session = arcgis(lambda url, p: {"error": {"code": 400, "message": "Invalid field", "details": ["LOT_AREA"]}})
+    with pytest.raises(app.ArcGISError, match="Invalid field"):
+        app._arcgis_query("https://example.test/query", "1=1", "LOT_AREA")
+    assert len(session.calls) == 1
+
+
+def paged_layer(ids, page_size):
+    """Layer with supportsPagination: the unordered first page, then OBJECTID-ordered slices."""
+    def handler(url, p):
+        offset = p.get("resultOffset")
+        if offset is None:
+            page, more = list(reversed(ids[:page_size])), True
+        else:
+            page = ids[offset:offset + p["resultRecordCount"]]
+            more = offset + len(page) < len(ids)
+        return {"features": [esri({"OBJECTID": i}) for i in page], "exceededTransferLimit": more}
+    return handler
+
+
+def test_arcgis_query_pages_past_the_transfer_limit(arcgis):
+    session = arcgis(paged_layer(list(range(1, 8)), 3))
+    fc = app._arcgis_query("https://example.test/query", "1=1", "*")
+    assert sorted(f["properties"]["OBJECTID"] for f in fc["features"]) == list(range(1, 8))
+    assert [p.get("resultOffset") for p in session.calls] == [None, 0, 3, 6]
+    assert all(p["orderByFields"] == "OBJECTID" for p in session.calls[1:])
+
+
+def test_arcgis_query_stops_when_offset_is_ignored(arcgis):
+    page = {"features": [esri({"OBJECTID": i}) for i in (1, 2, 3)], "exceededTransferLimit": True}
+    session = arcgis(lambda url, p: page)
+    fc = app._arcgis_query("https://example.test/query", "1=1", "*")
+    assert [f["properties"]["OBJECTID"] for f in fc["features"]] == [1, 2, 3]
+    assert len(session.calls) == 3
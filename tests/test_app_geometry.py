@@ -0,0 +1,15 @@
+import app
+
+
+def test_geom_bbox_skips_non_numbers():
+    geom = {"type": "LineString", "coordinates": [["3", "4"], [1, 2], [None, 5], [float("nan"), 0], [2.5, -1]]}
+    assert app._geom_bbox(geom) == (1.0, -1.0, 2.5, 2.0)
+    assert app._geom_bbox(geom) == app._geom_bbox_py(geom)
+    assert app._geom_bbox({"type": "Point", "coordinates": ["150", "-30"]}) is None
+
+
+def test_fit_zoom_bounds():
+    assert app._bbox_to_viewstate((150.0, -30.0, 150.0, -30.0)).zoom == 17
+    assert app._bbox_to_viewstate((150.0, -30.0, 150.000001, -30.0)).zoom == 17
+    assert app._bbox_to_viewstate((-180.0, -80.0, 180.0, 80.0)).zoom == 4
+    assert app._bbox_to_viewstate(None) is app.DEFAULT_VIEW
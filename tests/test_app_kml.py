@@ -0,0 +1,52 @@
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+import app
+
+NS = {"k": "http://www.opengis.net/kml/2.2"}
+
+
+def render(features):
+    mime, data = app.features_to_kml({"type": "FeatureCollection", "features": features})
+    assert mime == "application/vnd.google-earth.kml+xml"
+    return ET.fromstring(data)
+
+
+def test_polygon_placemark_with_hole_and_escaped_text():
+    outer = [[150.0, -28.0], [150.1, -28.0], [150.1, -28.1], [150.0, -28.0]]
+    hole = [[150.02, -28.02], [150.03, -28.02], [150.03, -28.03], [150.02, -28.02]]
+    root = render([{
+        "type": "Feature",
+        "properties": {"PLAN": "SP1", "LOTPLAN": "13SP1", "owner": "A & B <Ltd>", "empty": ""},
+        "geometry": {"type": "Polygon", "coordinates": [outer, hole]},
+    }])
+    (pm,) = root.findall(".//k:Placemark", NS)
+    assert pm.find("k:name", NS).text == "13SP1"  # LOTPLAN outranks PLAN in KML_NAME_KEYS
+    assert pm.find("k:description", NS).text == "LOTPLAN: 13SP1\nowner: A & B <Ltd>\nPLAN: SP1"
+    outer_text = pm.find("k:Polygon/k:outerBoundaryIs/k:LinearRing/k:coordinates", NS).text
+    assert outer_text == "150.0,-28.0,0 150.1,-28.0,0 150.1,-28.1,0 150.0,-28.0,0"
+    assert len(pm.findall("k:Polygon/k:innerBoundaryIs", NS)) == 1
+
+
+def test_lines_and_points():
+    root = render([
+        {"type": "Feature", "properties": {},
+         "geometry": {"type": "MultiLineString", "coordinates": [[[1, 2], [3, 4]], [[5, 6], [7, 8]]]}},
+        {"type": "Feature", "properties": {"planparcel": "D1A2"},
+         "geometry": {"type": "Point", "coordinates": [150.5, -30.5]}},
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Point", "coordinates": [None, None]}},
+    ])
+    placemarks = root.findall(".//k:Placemark", NS)
+    assert [pm.find("k:name", NS).text for pm in placemarks] == ["parcel", "parcel", "D1A2"]
+    assert placemarks[0].find("k:description", NS).text == "No attributes"
+    assert placemarks[2].find("k:Point/k:coordinates", NS).text == "150.5,-30.5,0"
+
+
+def test_kml_to_kmz_round_trips_the_document():
+    _, kml_data = app.features_to_kml({"type": "FeatureCollection", "features": []})
+    for stored, method in ((False, zipfile.ZIP_DEFLATED), (True, zipfile.ZIP_STORED)):
+        with zipfile.ZipFile(io.BytesIO(app.kml_to_kmz(kml_data, stored=stored))) as z:
+            assert z.namelist() == ["doc.kml"]
+            assert z.getinfo("doc.kml").compress_type == method
+            assert z.read("doc.kml") == kml_data
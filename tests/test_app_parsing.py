@@ -0,0 +1,38 @@
+import pytest
+
+import app
+
+
+def qld(raw, lot, plan_type, plan_number, section=None):
+    return {"raw": raw, "lot": lot, "section": section, "plan_type": plan_type, "plan_number": plan_number}
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("13//DP1246224", {"raw": "13//DP1246224", "nsw_lotid": "13//DP1246224"}),
+    ("13/DP1246224", {"raw": "13/DP1246224", "nsw_lotid": "13/DP1246224"}),
+    ("3/2/SP181800", qld("3/2/SP181800", "3", "SP", "181800", section="2")),
+    ("13sp181800", qld("13sp181800", "13", "SP", "181800")),
+    ("13 SP 181800", qld("13 SP 181800", "13", "SP", "181800")),
+    ("13 SP 181 800", qld("13 SP 181 800", "13", "SP", "181800")),
+    ("Lot 3 on Survey Plan 181800", qld("Lot 3 on Survey Plan 181800", "3", "SP", "181800")),
+    ("LOT 3 ON REGISTERED PLAN 12", qld("LOT 3 ON REGISTERED PLAN 12", "3", "RP", "12")),
+    # Tab separator skips the str.split fast path; the regex path must agree with it
+    ("lot\t3 on survey plan 1", qld("lot\t3 on survey plan 1", "3", "SP", "1")),
+    ("D12345A6", {"raw": "D12345A6", "sa_planparcel": "D12345A6"}),
+    ("1234/5678", {"raw": "1234/5678", "sa_titlepair": ("1234", "5678")}),
+    ("Lot ３ on Survey Plan 181800", {"raw": "Lot ３ on Survey Plan 181800", "unparsed": True}),
+    ("hello", {"raw": "hello", "unparsed": True}),
+])
+def test_parse_queries_line_formats(line, expected):
+    assert app.parse_queries(line) == [expected]
+
+
+def test_parse_queries_skips_blank_lines_and_strips():
+    items = app.parse_queries("  13SP181800  \n\n\t\n1234/5678\n")
+    assert [item["raw"] for item in items] == ["13SP181800", "1234/5678"]
+
+
+def test_qld_normalize_lotplan():
+    assert app._qld_normalize_lotplan("13 sp 181800") == "13SP181800"
+    assert app._qld_normalize_lotplan("Lot 2 on Registered Plan 5") == "2RP5"
+    assert app._qld_normalize_lotplan("not a lot") is None
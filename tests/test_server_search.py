@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+import server
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.content = json.dumps(payload).encode("utf-8")
+
+    def json(self):
+        return self.payload
+
+
+def feature(**props):
+    return {"type": "Feature", "properties": props, "geometry": None}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    server._CACHE.clear()
+    yield
+    server._CACHE.clear()
+
+
+@pytest.fixture
+def arcgis(monkeypatch):
+    """Serve canned features per endpoint and record every WHERE clause sent."""
+    responses = {server.NSW_QUERY: [], server.QLD_QUERY: [], server.SA_FEATURESERVER: []}
+    calls = []
+
+    def post(url, data=None, timeout=None):
+        calls.append((url, data["where"]))
+        return FakeResponse({"type": "FeatureCollection", "features": responses[url]})
+
+    monkeypatch.setattr(server.SESSION, "post", post)
+    return responses, calls
+
+
+def search(queries):
+    res = server.app.test_client().post("/search", json={"queries": queries})
+    return res.get_json()
+
+
+def test_parse_query_keys():
+    assert server._parse_query("1/2/DP123") == (("1", "2", 123), None, None)
+    assert server._parse_query("5//DP77") == (("5", "", 77), None, None)
+    assert server._parse_query("3 RP45") == (None, "3RP45", "3 RP45")
+
+
+def test_nsw_section_and_no_section(arcgis):
+    responses, calls = arcgis
+    responses[server.NSW_QUERY] = [
+        feature(lotnumber="5", sectionnumber=None, plannumber=77, planlabel="DP77"),
+        feature(lotnumber="1", sectionnumber="2", plannumber=123, planlabel="DP123"),
+    ]
+    data = search(["1/2/DP123", "5//DP77"])
+    assert [f["properties"]["planlabel"] for f in data["features"]] == ["DP123", "DP77"]
+    assert data["regions"] == ["NSW", "NSW"]
+    (url, where), = calls
+    assert url == server.NSW_QUERY
+    assert "sectionnumber='2'" in where
+    assert "(sectionnumber IS NULL OR sectionnumber = '')" in where
+
+
+def test_qld_lotplan_in_regrouping(arcgis):
+    responses, calls = arcgis
+    responses[server.QLD_QUERY] = [
+        feature(lot="4", plan="SP100", lotplan="4SP100"),
+        feature(lot="3", plan="RP45", lotplan="3RP45"),
+    ]
+    data = search(["3RP45", "4 SP100"])
+    assert [f["properties"]["lotplan"] for f in data["features"]] == ["3RP45", "4SP100"]
+    assert data["regions"] == ["QLD", "QLD"]
+    assert (server.QLD_QUERY, "lotplan IN ('3RP45','4SP100')") in calls
+
+
+def test_results_follow_query_order(arcgis):
+    responses, _ = arcgis
+    responses[server.NSW_QUERY] = [feature(lotnumber="1", sectionnumber="", plannumber=9)]
+    responses[server.QLD_QUERY] = [feature(lotplan="3RP45")]
+    responses[server.SA_FEATURESERVER] = [feature(parcel_id="3rp45")]
+    data = search(["3RP45", "1/DP9"])
+    assert data["regions"] == ["QLD", "SA", "NSW"]
+
+
+def test_duplicate_queries(arcgis):
+    responses, calls = arcgis
+    responses[server.QLD_QUERY] = [feature(lotplan="3RP45")]
+    data = search(["3RP45", "3RP45"])
+    assert data["regions"] == ["QLD", "QLD"]
+    assert (server.QLD_QUERY, "lotplan IN ('3RP45')") in calls
+    assert len(calls) == 2  # one QLD and one SA request, not one per query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_cache_expiry_hits_and_misses(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server, "time", clock)
+    server._cache_set("QLD", ["3RP45", "9RP1"], {"3RP45": [feature(lotplan="3RP45")]})
+
+    hits, missing = server._cache_get("QLD", ["3RP45", "9RP1", "4SP100"])
+    assert set(hits) == {"3RP45", "9RP1"} and missing == ["4SP100"]
+
+    clock.now += server.CACHE_MISS_TTL
+    hits, missing = server._cache_get("QLD", ["3RP45", "9RP1"])
+    assert list(hits) == ["3RP45"] and missing == ["9RP1"]
+
+    clock.now += server.CACHE_TTL
+    assert server._cache_get("QLD", ["3RP45"]) == ({}, ["3RP45"])
+
+
+def test_cache_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(server, "CACHE_MAX_ENTRIES", 3)
+    server._cache_set("SA", ["A", "B"], {})
+    server._cache_set("SA", ["C", "D"], {})
+    assert list(server._CACHE) == [("SA", "B"), ("SA", "C"), ("SA", "D")]
+    # Re-caching keys already present evicts nothing; a re-cached key moves to the young end
+    server._cache_set("SA", ["D"], {})
+    assert list(server._CACHE) == [("SA", "B"), ("SA", "C"), ("SA", "D")]
+    server._cache_set("SA", ["B"], {})
+    server._cache_set("SA", ["E"], {})
+    assert list(server._CACHE) == [("SA", "D"), ("SA", "B"), ("SA", "E")]